@@ -45,21 +45,61 @@ def create_app(config_name: str = 'default') -> Flask:
     # Data directory
     data_dir = get_data_dir()
     app.config['DATA_DIR'] = data_dir
-    app.config['UPLOAD_FOLDER'] = os.path.join(data_dir, 'uploads')
+    app.config['UPLOAD_FOLDER'] = os.path.join(data_dir, 'uploads')  # Files of unmigrated images
+    app.config['INCOMING_FOLDER'] = os.path.join(data_dir, 'incoming')  # Uploads awaiting ingestion
     app.config['EXPORT_FOLDER'] = os.path.join(data_dir, 'exports')
+    app.config['AUGMENT_CACHE_FOLDER'] = os.path.join(data_dir, 'augment_cache')
+    app.config['THUMBNAIL_FOLDER'] = os.path.join(data_dir, 'thumbnails')
     app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(data_dir, 'labelstudio.db')}"
 
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['INCOMING_FOLDER'], exist_ok=True)
     os.makedirs(app.config['EXPORT_FOLDER'], exist_ok=True)
 
     # Initialize extensions
     cors.init_app(app)
     db.init_app(app)
 
+    # SQLite tuning for concurrent use (WAL, busy timeout, page cache)
+    from app.database import sqlite_profile
+    sqlite_profile.init_app(app)
+
+    # Content-addressed image storage
+    from app.storage import blobs
+    blobs.init_app(app)
+
+    # Background export jobs
+    from app.services.export_jobs import export_jobs
+    export_jobs.init_app(app)
+
+    # Augmented sample cache
+    from app.services.augment_cache import augment_cache
+    augment_cache.init_app(app)
+
+    # Image thumbnails
+    from app.services.thumbnails import thumbnails
+    thumbnails.init_app(app)
+
+    # Background processing of uploaded files
+    from app.services.ingest import ingest
+    ingest.init_app(app)
+
+    # Resumable chunked uploads
+    from app.services.chunked_upload import chunked_uploads
+    chunked_uploads.init_app(app)
+
+    # Background removal of deleted files
+    from app.services.reclaim import reclaimer
+    reclaimer.init_app(app)
+
     # Register blueprints
     from app.routes import register_blueprints
     register_blueprints(app)
 
+    # CLI commands (flask --app "app:create_app()" ...)
+    from app.commands import register_commands
+    register_commands(app)
+
     # Frontend routes: return index.html for non-API requests (SPA)
     @app.route('/')
     def index():
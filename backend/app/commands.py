@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+CLI Commands
+
+Run with the Flask CLI, e.g.:
+
+    flask --app "app:create_app()" schema upgrade
+    flask --app "app:create_app()" storage migrate
+    flask --app "app:create_app()" annotations recount
+    flask --app "app:create_app()" storage gc --dry-run
+"""
+import click
+from flask import Flask
+from flask.cli import AppGroup
+
+storage_cli = AppGroup('storage', help='Image storage maintenance.')
+schema_cli = AppGroup('schema', help='Database schema migrations.')
+annotations_cli = AppGroup('annotations', help='Annotation data maintenance.')
+
+
+@schema_cli.command('upgrade')
+def upgrade_database():
+    """Create missing tables and apply pending migrations."""
+    from app.extensions import db
+    from app.schema import current_version, upgrade_schema
+
+    db.create_all()
+    applied = upgrade_schema()
+    click.echo(f"Applied {applied} migrations, schema version {current_version()}")
+
+
+@storage_cli.command('migrate')
+@click.option('--project', 'project_id', type=int, default=None, help='Only migrate this project.')
+@click.option('--dry-run', is_flag=True, help='Only report what would be migrated.')
+def migrate_storage(project_id, dry_run):
+    """Move images uploaded before blob storage into the blob store."""
+    from app.schema import upgrade_schema
+    from app.services.storage_migration import migrate_to_blobs
+
+    upgrade_schema()
+    counts = migrate_to_blobs(project_id=project_id, dry_run=dry_run, log=click.echo)
+    verb = 'Would migrate' if dry_run else 'Migrated'
+    click.echo(f"{verb} {counts['migrated']} images "
+               f"({counts['skipped']} already migrated, {counts['missing']} missing files)")
+
+
+@storage_cli.command('gc')
+@click.option('--dry-run', is_flag=True, help='Only report what would be removed.')
+def collect_garbage(dry_run):
+    """Remove files no image, upload or export references."""
+    from app.services.reclaim import reclaimer
+
+    counts = reclaimer.collect_garbage(dry_run=dry_run)
+    verb = 'Would remove' if dry_run else 'Removed'
+    click.echo(f"{verb} {counts['files']} files, {counts['bytes'] / 1024 / 1024:.1f} MB "
+               f"({counts['blobs']} blobs, {counts['uploads']} unmigrated uploads, "
+               f"{counts['thumbnails']} thumbnails, {counts['incoming']} incoming, "
+               f"{counts['exports']} exports)")
+
+
+@annotations_cli.command('recount')
+@click.option('--project', 'project_id', type=int, default=None, help='Only repair this project.')
+def recount_annotation_counts(project_id):
+    """Recompute the annotation count stored on each image."""
+    from app.services.annotation_counts import recount_annotations
+
+    click.echo(f"Repaired the annotation count of {recount_annotations(project_id)} images")
+
+
+def register_commands(app: Flask):
+    """Register all CLI command groups"""
+    app.cli.add_command(schema_cli)
+    app.cli.add_command(annotations_cli)
+    app.cli.add_command(storage_cli)
@@ -14,6 +14,65 @@ class Config:
     # Allowed image extensions
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp'}
 
+    # SQLite engine profile applied to every connection (see app/database.py):
+    # WAL journaling, how long a writer waits for the current one (ms), page
+    # cache and memory-mapped I/O sizes (bytes), and how often the WAL is
+    # checkpointed (seconds, 0 = only SQLite's automatic checkpoints) and
+    # truncated once larger than SQLITE_WAL_SIZE_LIMIT
+    SQLITE_JOURNAL_MODE = 'WAL'
+    SQLITE_SYNCHRONOUS = 'NORMAL'
+    SQLITE_BUSY_TIMEOUT = 30000
+    SQLITE_CACHE_SIZE = 64 * 1024 * 1024
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+    SQLITE_CHECKPOINT_INTERVAL = 300
+    SQLITE_WAL_SIZE_LIMIT = 64 * 1024 * 1024
+
+    # Background export worker threads
+    EXPORT_JOB_WORKERS = 1
+
+    # Export augmentation workers (None = CPU count, 1 = run inline), how many
+    # images may be in flight between them and the zip writer, and whether
+    # they are processes or threads ('process' / 'thread')
+    EXPORT_AUGMENT_WORKERS = None
+    EXPORT_AUGMENT_IN_FLIGHT = None
+    EXPORT_AUGMENT_BACKEND = 'process'
+
+    # Items buffered between export pipeline stages (read, augment, write)
+    EXPORT_PIPELINE_DEPTH = 8
+
+    # On-disk cache of seeded augmentation results (0 disables it)
+    AUGMENT_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+    # Upload ingestion: threads probing uploaded files (None = CPU count) and
+    # images inserted per transaction
+    INGEST_WORKERS = None
+    INGEST_INSERT_CHUNK = 100
+
+    # Chunked mobile uploads: suggested chunk size and how long unfinished
+    # uploads are kept (seconds)
+    UPLOAD_CHUNK_SIZE = 1024 * 1024
+    UPLOAD_SESSION_TTL = 24 * 3600
+
+    # Gallery thumbnails ('webp' falls back to 'jpeg' without WebP support)
+    THUMBNAIL_FORMAT = 'webp'
+    THUMBNAIL_QUALITY = 80
+    THUMBNAIL_WORKERS = 2
+
+    # Files of deleted images are removed in the background; unreferenced
+    # files are garbage collected every STORAGE_GC_INTERVAL seconds (0 = only
+    # via `flask storage gc`) once older than STORAGE_GC_GRACE seconds
+    STORAGE_GC_INTERVAL = 6 * 3600
+    STORAGE_GC_GRACE = 3600
+
+    # Browser cache lifetime of image files and thumbnails (served as immutable)
+    MEDIA_CACHE_MAX_AGE = 365 * 24 * 3600
+
+    # Let a reverse proxy send image files: an nginx internal location that
+    # maps to DATA_DIR (e.g. '/protected-data/', sent as X-Accel-Redirect), or
+    # USE_X_SENDFILE = True for Apache / lighttpd X-Sendfile
+    MEDIA_ACCEL_REDIRECT = None
+    USE_X_SENDFILE = False
+
     # Default language
     DEFAULT_LOCALE = 'zh-TW'
     SUPPORTED_LOCALES = ['zh-TW', 'en']
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite Engine Profile
+
+SQLite's defaults suit a single user: a rollback journal that blocks
+readers while a transaction commits, and writers that give up with
+"database is locked" almost at once. A classroom saving annotations while
+an export reads the whole project needs more, so every new connection gets:
+
+- journal_mode=WAL: readers never block the writer and the writer never
+  blocks readers; only writers queue for each other
+- busy_timeout: a writer waits for the current one instead of failing
+- synchronous=NORMAL: no fsync per commit (WAL stays consistent after a
+  crash, only the last commits can be lost on power failure)
+- cache_size / mmap_size: hot pages stay in memory and are read without
+  system calls
+
+WAL files only shrink when a checkpoint finds no reader on an older
+snapshot, which long exports prevent. SQLiteProfile.start_checkpoints()
+checkpoints periodically and truncates the WAL once it grows beyond
+SQLITE_WAL_SIZE_LIMIT.
+"""
+import os
+import time
+import threading
+from typing import Dict, Optional
+from flask import Flask
+from sqlalchemy import event
+from app.extensions import db
+
+
+def sqlite_pragmas(config) -> Dict[str, object]:
+    """PRAGMA values of the engine profile, from the app config"""
+    return {
+        'journal_mode': config.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': config.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': config.get('SQLITE_BUSY_TIMEOUT', 30000),
+        'cache_size': -(config.get('SQLITE_CACHE_SIZE', 64 * 1024 * 1024) // 1024),  # Negative = KiB
+        'mmap_size': config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024),
+        'journal_size_limit': config.get('SQLITE_WAL_SIZE_LIMIT', 64 * 1024 * 1024),
+        'temp_store': 'MEMORY',
+    }
+
+
+def apply_pragmas(dbapi_connection, pragmas: Dict[str, object]):
+    """Run PRAGMA statements on a new DB-API connection"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+
+class SQLiteProfile:
+    """Applies the engine profile to the app's SQLite engine and manages WAL checkpoints"""
+
+    def __init__(self, app: Flask = None):
+        self.app = None
+        self.engine = None
+        self.pragmas = {}
+        self._checkpointer = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        self.app = app
+        app.extensions['sqlite_profile'] = self
+
+        with app.app_context():
+            engine = db.engine
+        if engine.dialect.name != 'sqlite' or not engine.url.database or engine.url.database == ':memory:':
+            return
+
+        self.engine = engine
+        self.pragmas = sqlite_pragmas(app.config)
+        event.listen(engine, 'connect', self._on_connect)
+
+    @property
+    def database_path(self) -> Optional[str]:
+        return self.engine.url.database if self.engine is not None else None
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, self.pragmas)
+
+    def start_checkpoints(self):
+        """Checkpoint the WAL every SQLITE_CHECKPOINT_INTERVAL seconds on a background thread"""
+        interval = self.app.config.get('SQLITE_CHECKPOINT_INTERVAL', 300)
+        if self.engine is None or not interval or str(self.pragmas['journal_mode']).upper() != 'WAL':
+            return
+
+        with self._lock:
+            if self._checkpointer is None or not self._checkpointer.is_alive():
+                self._checkpointer = threading.Thread(target=self._run_checkpoints, args=(interval,),
+                                                      name='sqlite-checkpoint', daemon=True)
+                self._checkpointer.start()
+
+    def _run_checkpoints(self, interval: float):
+        while True:
+            time.sleep(interval)
+            try:
+                self.checkpoint()
+            except Exception as e:
+                print(f"WAL checkpoint failed: {e}")
+
+    def checkpoint(self) -> Dict[str, int]:
+        """
+        Copy committed WAL pages into the database file
+
+        A PASSIVE checkpoint never waits for readers or writers. When the WAL
+        has grown beyond SQLITE_WAL_SIZE_LIMIT a TRUNCATE checkpoint follows,
+        with a short busy timeout so it gives up rather than stall writers
+        behind a long-running export.
+
+        Returns:
+            'busy' (1 if the checkpoint could not finish), 'log' (WAL frames)
+            and 'checkpointed' (frames copied), as reported by SQLite
+        """
+        wal_path = f'{self.database_path}-wal'
+        with self.engine.connect() as conn:
+            busy, log, checkpointed = conn.exec_driver_sql('PRAGMA wal_checkpoint(PASSIVE)').one()
+            if os.path.exists(wal_path) and os.path.getsize(wal_path) > self.pragmas['journal_size_limit']:
+                conn.exec_driver_sql('PRAGMA busy_timeout=100')
+                try:
+                    busy, log, checkpointed = conn.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)').one()
+                finally:
+                    conn.exec_driver_sql(f"PRAGMA busy_timeout={self.pragmas['busy_timeout']}")
+        return {'busy': busy, 'log': log, 'checkpointed': checkpointed}
+
+
+sqlite_profile = SQLiteProfile()
@@ -8,5 +8,9 @@ from app.models.image import Image
 from app.models.annotation import Annotation
 from app.models.label_class import LabelClass
 from app.models.member import ProjectMember
+from app.models.export_job import ExportJob
+from app.models.upload_batch import UploadBatch
+from app.models.chunked_upload import ChunkedUpload
 
-__all__ = ['User', 'Project', 'Image', 'Annotation', 'LabelClass', 'ProjectMember']
+__all__ = ['User', 'Project', 'Image', 'Annotation', 'LabelClass', 'ProjectMember', 'ExportJob',
+           'UploadBatch', 'ChunkedUpload']
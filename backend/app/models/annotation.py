@@ -10,6 +10,10 @@ import json
 class Annotation(db.Model):
     """Annotation on an image"""
     __tablename__ = 'annotations'
+    __table_args__ = (
+        db.Index('ix_annotations_image_class', 'image_id', 'class_id'),
+        db.Index('ix_annotations_class', 'class_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     image_id = db.Column(db.Integer, db.ForeignKey('images.id'), nullable=False)
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Chunked Upload Model
+"""
+from datetime import datetime
+from app.extensions import db
+
+
+class ChunkedUpload(db.Model):
+    """A file being uploaded in chunks; the bytes received so far are on disk"""
+    __tablename__ = 'chunked_uploads'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+
+    filename = db.Column(db.String(255), nullable=False)  # Saved name in the project folder
+    original_filename = db.Column(db.String(255), nullable=True)
+    uploader_name = db.Column(db.String(80), nullable=True)
+    total_size = db.Column(db.Integer, nullable=False)
+
+    status = db.Column(db.String(20), default='uploading')  # uploading, completed
+    batch_id = db.Column(db.String(32), nullable=True)  # UploadBatch created on finalize
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self, offset: int = None) -> dict:
+        return {
+            'id': self.id,
+            'project_id': self.project_id,
+            'filename': self.filename,
+            'original_filename': self.original_filename,
+            'size': self.total_size,
+            'offset': offset,
+            'status': self.status,
+            'batch_id': self.batch_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
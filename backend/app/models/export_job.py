@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Export Job Model
+"""
+from datetime import datetime
+from app.extensions import db
+import json
+
+
+class ExportJob(db.Model):
+    """Background export job"""
+    __tablename__ = 'export_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+
+    # Which exporter runs the job
+    exporter = db.Column(db.String(20), default='dataset')  # dataset, archive
+    format = db.Column(db.String(20), nullable=False)
+    options = db.Column(db.Text, nullable=True)  # JSON request options
+
+    # Status
+    status = db.Column(db.String(20), default='queued')  # queued, running, completed, failed, cancelled
+    cancel_requested = db.Column(db.Boolean, default=False)
+    error = db.Column(db.Text, nullable=True)
+
+    # Progress
+    images_done = db.Column(db.Integer, default=0)
+    images_total = db.Column(db.Integer, default=0)
+    bytes_written = db.Column(db.Integer, default=0)
+
+    # Artifact
+    file_path = db.Column(db.String(500), nullable=True)
+    file_size = db.Column(db.Integer, nullable=True)
+    download_name = db.Column(db.String(255), nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def get_options(self) -> dict:
+        return json.loads(self.options) if self.options else {}
+
+    def set_options(self, options: dict):
+        self.options = json.dumps(options)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ('completed', 'failed', 'cancelled')
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'project_id': self.project_id,
+            'exporter': self.exporter,
+            'format': self.format,
+            'status': self.status,
+            'cancel_requested': self.cancel_requested,
+            'error': self.error,
+            'progress': {
+                'images_done': self.images_done,
+                'images_total': self.images_total,
+                'bytes_written': self.bytes_written
+            },
+            'file_size': self.file_size,
+            'download_url': f'/api/export/jobs/{self.id}/download' if self.status == 'completed' else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
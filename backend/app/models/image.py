@@ -4,20 +4,30 @@ Image Model
 """
 from datetime import datetime
 from app.extensions import db
+from app.storage import blobs
 
 
 class Image(db.Model):
     """Image in a project"""
     __tablename__ = 'images'
+    __table_args__ = (
+        db.Index('ix_images_project_content_hash', 'project_id', 'content_hash'),
+        db.Index('ix_images_file_path', 'file_path'),
+        db.Index('ix_images_project_uploaded', 'project_id', 'uploaded_at'),
+        db.Index('ix_images_project_status', 'project_id', 'status'),
+        db.Index('ix_images_project_assigned', 'project_id', 'assigned_to', 'uploaded_at'),
+        db.Index('ix_images_project_annotated', 'project_id', 'annotated_by'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
     filename = db.Column(db.String(255), nullable=False)
     original_filename = db.Column(db.String(255), nullable=True)
-    file_path = db.Column(db.String(500), nullable=False)
+    storage_key = db.Column('file_path', db.String(500), nullable=False)  # Blob key relative to DATA_DIR
     width = db.Column(db.Integer, nullable=True)
     height = db.Column(db.Integer, nullable=True)
     file_size = db.Column(db.Integer, nullable=True)
+    content_hash = db.Column(db.String(64), nullable=True)  # SHA-256 hex, duplicate detection
 
     # Dataset split
     split = db.Column(db.String(20), default='train')  # train, val, test
@@ -32,10 +42,29 @@ class Image(db.Model):
     status = db.Column(db.String(20), default='pending')  # pending, annotated, reviewed
     assigned_to = db.Column(db.String(100), nullable=True)  # Username assigned to annotate
     annotated_by = db.Column(db.String(100), nullable=True)  # Username who actually annotated
+    annotation_count = db.Column(db.Integer, default=0)  # Kept in sync on write (services/annotation_counts.py)
 
     # Relationships
     annotations = db.relationship('Annotation', backref='image', lazy='dynamic', cascade='all, delete-orphan')
 
+    @property
+    def file_path(self) -> str:
+        """Absolute path of the image file"""
+        return blobs.path(self.storage_key)
+
+    @property
+    def url(self) -> str:
+        """Media URL of the image file (served without a database lookup)"""
+        if blobs.is_blob_key(self.storage_key):
+            return f'/media/{self.storage_key}'
+        return f'/media/{self.project_id}/{self.filename}'
+
+    def thumb_url(self, size: int = 256) -> str:
+        """Media URL of a thumbnail (longest side rounded up to 128, 256 or 1024)"""
+        if blobs.is_blob_key(self.storage_key):
+            return f'/media/thumbs/{size}/{self.storage_key}'
+        return f'/media/{self.project_id}/thumbs/{size}/{self.filename}'
+
     def to_dict(self) -> dict:
         return {
             'id': self.id,
@@ -50,5 +79,7 @@ class Image(db.Model):
             'uploader': self.uploader_name,
             'upload_source': self.upload_source,
             'uploaded_at': self.uploaded_at.isoformat(),
-            'annotation_count': self.annotations.count()
+            'url': self.url,
+            'thumb_url': self.thumb_url(),
+            'annotation_count': self.annotation_count or 0
         }
@@ -23,6 +23,9 @@ class Project(db.Model):
     val_ratio = db.Column(db.Float, default=0.2)
     test_ratio = db.Column(db.Float, default=0.1)
 
+    # What happens to an upload identical to an image already in the project
+    duplicate_policy = db.Column(db.String(20), default='reject')  # reject, link
+
     # Relationships
     images = db.relationship('Image', backref='project', lazy='dynamic', cascade='all, delete-orphan')
     label_classes = db.relationship('LabelClass', backref='project', lazy='dynamic', cascade='all, delete-orphan')
@@ -40,5 +43,6 @@ class Project(db.Model):
                 'train': self.train_ratio,
                 'val': self.val_ratio,
                 'test': self.test_ratio
-            }
+            },
+            'duplicate_policy': self.duplicate_policy or 'reject'
         }
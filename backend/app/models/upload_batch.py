@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Upload Batch Model
+"""
+from datetime import datetime
+from app.extensions import db
+import json
+
+
+class UploadBatch(db.Model):
+    """Uploaded files waiting to be probed and added to a project"""
+    __tablename__ = 'upload_batches'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+
+    # Upload info, copied to the created images
+    upload_source = db.Column(db.String(20), default='web')  # web, mobile
+    uploader_name = db.Column(db.String(80), nullable=True)
+    files = db.Column(db.Text, nullable=True)  # JSON [{filename, original_filename, content_hash?}]
+
+    # Status
+    status = db.Column(db.String(20), default='queued')  # queued, processing, completed, failed
+    error = db.Column(db.Text, nullable=True)
+    file_errors = db.Column(db.Text, nullable=True)  # JSON [{file, filename, error}] of rejected files
+    duplicates = db.Column(db.Text, nullable=True)  # JSON [{file, filename, duplicate_of}] of files linked to an existing blob
+
+    # Progress
+    files_total = db.Column(db.Integer, default=0)
+    files_done = db.Column(db.Integer, default=0)
+    files_failed = db.Column(db.Integer, default=0)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def get_files(self) -> list:
+        return json.loads(self.files) if self.files else []
+
+    def set_files(self, files: list):
+        self.files = json.dumps(files)
+
+    def get_file_errors(self) -> list:
+        return json.loads(self.file_errors) if self.file_errors else []
+
+    def set_file_errors(self, errors: list):
+        self.file_errors = json.dumps(errors, ensure_ascii=False)
+
+    def get_duplicates(self) -> list:
+        return json.loads(self.duplicates) if self.duplicates else []
+
+    def set_duplicates(self, duplicates: list):
+        self.duplicates = json.dumps(duplicates, ensure_ascii=False)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ('completed', 'failed')
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'project_id': self.project_id,
+            'upload_source': self.upload_source,
+            'status': self.status,
+            'error': self.error,
+            'file_errors': self.get_file_errors(),
+            'duplicates': self.get_duplicates(),
+            'progress': {
+                'files_done': self.files_done,
+                'files_failed': self.files_failed,
+                'files_total': self.files_total
+            },
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
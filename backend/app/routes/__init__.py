@@ -14,6 +14,7 @@ def register_blueprints(app: Flask):
     from .export import export_bp
     from .qrcode import qr_bp
     from .members import members_bp
+    from .media import media_bp
 
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(projects_bp, url_prefix='/api/projects')
@@ -22,3 +23,4 @@ def register_blueprints(app: Flask):
     app.register_blueprint(export_bp, url_prefix='/api/export')
     app.register_blueprint(qr_bp, url_prefix='/api/qr')
     app.register_blueprint(members_bp, url_prefix='/api/members')
+    app.register_blueprint(media_bp, url_prefix='/media')
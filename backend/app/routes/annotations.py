@@ -5,6 +5,7 @@ Annotation Routes
 from flask import Blueprint, request, jsonify
 from app.models import Annotation, Image, LabelClass
 from app.extensions import db
+from app.services.annotation_counts import adjust_annotation_counts
 
 annotations_bp = Blueprint('annotations', __name__)
 
@@ -42,7 +43,8 @@ def save_annotations(image_id):
         annotation.set_data(anno_data.get('data', {}))
         db.session.add(annotation)
 
-    # Update image status and annotator
+    # Update image status, annotator and the denormalized count
+    image.annotation_count = len(annotations_data)
     if annotations_data:
         image.status = 'annotated'
         if annotated_by:
@@ -88,6 +90,7 @@ def update_annotation(annotation_id):
 def delete_annotation(annotation_id):
     """Delete an annotation"""
     annotation = Annotation.query.get_or_404(annotation_id)
+    adjust_annotation_counts({annotation.image_id: -1})
     db.session.delete(annotation)
     db.session.commit()
     return jsonify({'success': True})
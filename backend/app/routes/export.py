@@ -3,8 +3,10 @@
 Export Routes
 """
 from flask import Blueprint, request, jsonify, send_file, current_app
-from app.models import Project
+from app.models import Project, ExportJob
 from app.services.exporter import DatasetExporter
+from app.services.export_jobs import export_jobs
+from app.extensions import db
 import os
 
 export_bp = Blueprint('export', __name__)
@@ -20,6 +22,11 @@ def export_project(project_id):
     include_augmentation = data.get('augmentation', False)
     augmentation_config = data.get('augmentation_config', {})
 
+    # Run in the background and return a job to poll
+    if data.get('background'):
+        job = export_jobs.submit(project, 'dataset', data)
+        return jsonify(job.to_dict()), 202
+
     exporter = DatasetExporter(project, current_app.config['EXPORT_FOLDER'])
 
     try:
@@ -39,6 +46,59 @@ def export_project(project_id):
         return jsonify({'error': str(e)}), 500
 
 
+@export_bp.route('/project/<int:project_id>/jobs', methods=['GET'])
+def list_jobs(project_id):
+    """List export jobs of a project"""
+    Project.query.get_or_404(project_id)
+    jobs = ExportJob.query.filter_by(project_id=project_id).order_by(ExportJob.created_at.desc()).all()
+    return jsonify([job.to_dict() for job in jobs])
+
+
+@export_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get export job status and progress"""
+    job = ExportJob.query.get_or_404(job_id)
+    return jsonify(job.to_dict())
+
+
+@export_bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running export job"""
+    job = ExportJob.query.get_or_404(job_id)
+    export_jobs.cancel(job)
+    return jsonify(job.to_dict())
+
+
+@export_bp.route('/jobs/<job_id>/download', methods=['GET'])
+def download_job(job_id):
+    """Download a finished export (supports Range requests for resuming)"""
+    job = ExportJob.query.get_or_404(job_id)
+    if job.status != 'completed' or not job.file_path or not os.path.exists(job.file_path):
+        return jsonify({'error': 'Export is not ready', 'status': job.status}), 409
+
+    return send_file(
+        job.file_path,
+        mimetype='application/zip',
+        as_attachment=True,
+        download_name=job.download_name,
+        conditional=True
+    )
+
+
+@export_bp.route('/jobs/<job_id>', methods=['DELETE'])
+def delete_job(job_id):
+    """Delete a finished export job and its file"""
+    job = ExportJob.query.get_or_404(job_id)
+    if not job.is_finished:
+        return jsonify({'error': 'Job is still active, cancel it first'}), 409
+
+    if job.file_path and os.path.exists(job.file_path):
+        os.remove(job.file_path)
+    db.session.delete(job)
+    db.session.commit()
+    return jsonify({'success': True})
+
+
 @export_bp.route('/formats', methods=['GET'])
 def list_formats():
     """List available export formats"""
@@ -2,13 +2,16 @@
 """
 Image Routes
 """
-from flask import Blueprint, request, jsonify, current_app, send_from_directory
+from flask import Blueprint, request, jsonify, current_app
 from werkzeug.utils import secure_filename
-from app.models import Image, Project
+from app.models import Image, Project, UploadBatch
 from app.extensions import db
-from PIL import Image as PILImage
-import os
-import uuid
+from app.storage import blobs
+from app.services.deletion import delete_images
+from app.services.ingest import ingest
+from app.services.thumbnails import thumbnails
+from app.utils.file import save_uploaded_file
+from app.utils.http import send_revalidated_file
 
 images_bp = Blueprint('images', __name__)
 
@@ -29,52 +32,41 @@ def list_images(project_id):
 
 @images_bp.route('/project/<int:project_id>/upload', methods=['POST'])
 def upload_images(project_id):
-    """Upload images to a project"""
+    """
+    Upload images to a project
+
+    Files are stored right away; images are added once the batch has been
+    processed (poll /api/images/batches/<batch_id>).
+    """
     project = Project.query.get_or_404(project_id)
 
     if 'images' not in request.files:
         return jsonify({'error': 'No images provided'}), 400
 
-    files = request.files.getlist('images')
-    uploaded = []
-
-    for file in files:
+    saved = []
+    for file in request.files.getlist('images'):
         if file and allowed_file(file.filename):
-            # Generate unique filename
-            ext = file.filename.rsplit('.', 1)[1].lower()
-            filename = f"{uuid.uuid4().hex}.{ext}"
-
-            # Save file
-            project_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], str(project_id))
-            os.makedirs(project_folder, exist_ok=True)
-            file_path = os.path.join(project_folder, filename)
-            file.save(file_path)
-
-            # Get image dimensions
-            with PILImage.open(file_path) as img:
-                width, height = img.size
-
-            # Create database record
-            image = Image(
-                project_id=project.id,
-                filename=filename,
-                original_filename=secure_filename(file.filename),
-                file_path=file_path,
-                width=width,
-                height=height,
-                file_size=os.path.getsize(file_path),
-                upload_source='web'
-            )
-            db.session.add(image)
-            uploaded.append(image)
+            filename, content_hash = save_uploaded_file(file, project.id)
+            saved.append({
+                'filename': filename,
+                'original_filename': secure_filename(file.filename),
+                'content_hash': content_hash
+            })
 
-    db.session.commit()
+    batch = ingest.submit(project, saved, upload_source='web')
 
     return jsonify({
         'success': True,
-        'uploaded': len(uploaded),
-        'images': [img.to_dict() for img in uploaded]
-    })
+        'uploaded': len(saved),
+        'batch': batch.to_dict()
+    }), 202
+
+
+@images_bp.route('/batches/<batch_id>', methods=['GET'])
+def get_upload_batch(batch_id):
+    """Get upload batch status and progress"""
+    batch = UploadBatch.query.get_or_404(batch_id)
+    return jsonify(batch.to_dict())
 
 
 @images_bp.route('/<int:image_id>', methods=['GET'])
@@ -86,10 +78,21 @@ def get_image(image_id):
 
 @images_bp.route('/<int:image_id>/file', methods=['GET'])
 def get_image_file(image_id):
-    """Serve image file"""
+    """Serve image file (revalidated by ETag, ids are reused; supports Range requests)"""
+    image = Image.query.get_or_404(image_id)
+    return send_revalidated_file(image.file_path, etag=blobs.hash_of(image.storage_key))
+
+
+@images_bp.route('/<int:image_id>/thumb', methods=['GET'])
+def get_image_thumbnail(image_id):
+    """Serve a thumbnail (?size= longest side, rounded up to 128, 256 or 1024)"""
     image = Image.query.get_or_404(image_id)
-    directory = os.path.dirname(image.file_path)
-    return send_from_directory(directory, image.filename)
+    size = thumbnails.pick_size(request.args.get('size', type=int))
+
+    path = thumbnails.get(image.storage_key, size)
+    if path is None:
+        return jsonify({'error': 'Failed to create thumbnail'}), 500
+    return send_revalidated_file(path, mimetype=thumbnails.mimetype)
 
 
 @images_bp.route('/<int:image_id>/split', methods=['PUT'])
@@ -124,11 +127,29 @@ def update_status(image_id):
 def delete_image(image_id):
     """Delete an image"""
     image = Image.query.get_or_404(image_id)
+    delete_images(image.project_id, [image.id])
+    return jsonify({'success': True})
 
-    # Delete file if exists
-    if os.path.exists(image.file_path):
-        os.remove(image.file_path)
 
-    db.session.delete(image)
-    db.session.commit()
-    return jsonify({'success': True})
+@images_bp.route('/project/<int:project_id>/delete', methods=['POST'])
+def delete_image_batch(project_id):
+    """
+    Delete several images of a project
+
+    Body: {"image_ids": [...]} or {"all": true}. Files are removed in the
+    background once no other image shares them.
+    """
+    Project.query.get_or_404(project_id)
+    data = request.get_json() or {}
+
+    if data.get('all'):
+        deleted = delete_images(project_id)
+    elif isinstance(data.get('image_ids'), list):
+        try:
+            deleted = delete_images(project_id, data['image_ids'])
+        except (TypeError, ValueError):
+            return jsonify({'error': 'image_ids must be a list of ids'}), 400
+    else:
+        return jsonify({'error': 'No images selected'}), 400
+
+    return jsonify({'success': True, 'deleted': deleted})
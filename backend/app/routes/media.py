@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Media Routes
+
+Image files and thumbnails addressed by their storage key. Blobs are named
+by their content hash and never change, so the path and the ETag come from
+the URL alone, without a database lookup, and responses are cached by
+browsers (see app.utils.http). Images not yet migrated to blob storage are
+served from uploads/<project_id>/<filename>.
+"""
+import os
+from flask import Blueprint, current_app, jsonify
+from werkzeug.security import safe_join
+from werkzeug.exceptions import NotFound
+from app.storage import blobs, BLOB_PREFIX
+from app.services.thumbnails import thumbnails
+from app.utils.http import send_immutable_file
+
+media_bp = Blueprint('media', __name__)
+
+
+def _blob_key(shard: str, sub: str, name: str) -> str:
+    """Storage key of a blob URL, 404 for malformed or missing blobs"""
+    key = '/'.join((BLOB_PREFIX, shard, sub, name))
+    if not blobs.is_blob_key(key) or not blobs.exists(key):
+        raise NotFound()
+    return key
+
+
+def _upload_path(project_id: int, filename: str) -> str:
+    """Path of an unmigrated upload, 404 for missing files and names outside the project folder"""
+    path = safe_join(current_app.config['UPLOAD_FOLDER'], str(project_id), filename)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+    return path
+
+
+def _send_thumbnail(key: str, size: int):
+    path = thumbnails.get(key, thumbnails.pick_size(size))
+    if path is None:
+        return jsonify({'error': 'Failed to create thumbnail'}), 404
+    return send_immutable_file(path, mimetype=thumbnails.mimetype)
+
+
+@media_bp.route('/blobs/<shard>/<sub>/<name>', methods=['GET'])
+def get_blob(shard, sub, name):
+    """Serve an image from blob storage"""
+    key = _blob_key(shard, sub, name)
+    return send_immutable_file(blobs.path(key), etag=blobs.hash_of(key))
+
+
+@media_bp.route('/thumbs/<int:size>/blobs/<shard>/<sub>/<name>', methods=['GET'])
+def get_blob_thumbnail(size, shard, sub, name):
+    """Serve a thumbnail of a blob (size rounded up to 128, 256 or 1024)"""
+    return _send_thumbnail(_blob_key(shard, sub, name), size)
+
+
+@media_bp.route('/<int:project_id>/<filename>', methods=['GET'])
+def get_media_file(project_id, filename):
+    """Serve an unmigrated upload"""
+    return send_immutable_file(_upload_path(project_id, filename))
+
+
+@media_bp.route('/<int:project_id>/thumbs/<int:size>/<filename>', methods=['GET'])
+def get_media_thumbnail(project_id, size, filename):
+    """Serve a thumbnail of an unmigrated upload"""
+    return _send_thumbnail(_upload_path(project_id, filename), size)
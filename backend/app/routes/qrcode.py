@@ -4,15 +4,16 @@ QR Code Routes for Mobile Upload
 """
 from flask import Blueprint, request, jsonify, current_app
 from werkzeug.utils import secure_filename
-from app.models import Image, Project
+from app.models import Image, Project, ChunkedUpload
+from app.utils.file import save_uploaded_file
 from app.utils.network import get_local_ip
 from app.extensions import db
-from PIL import Image as PILImage
+from app.services.ingest import ingest
+from app.services.chunked_upload import chunked_uploads, UploadOffsetError
+from app.routes.images import allowed_file
 import qrcode
 import io
 import base64
-import os
-import uuid
 
 qr_bp = Blueprint('qrcode', __name__)
 
@@ -64,52 +65,113 @@ def quick_upload(project_id):
     if not files:
         return jsonify({'error': 'No images provided'}), 400
 
-    uploaded = []
-
+    saved = []
     for file in files:
         if file and file.filename:
-            # Generate unique filename
-            ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else 'jpg'
-            filename = f"{uuid.uuid4().hex}.{ext}"
-
-            # Save file
-            project_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], str(project_id))
-            os.makedirs(project_folder, exist_ok=True)
-            file_path = os.path.join(project_folder, filename)
-            file.save(file_path)
-
-            # Get image dimensions
-            try:
-                with PILImage.open(file_path) as img:
-                    width, height = img.size
-            except Exception:
-                width, height = None, None
-
-            # Create database record
-            image = Image(
-                project_id=project.id,
-                filename=filename,
-                original_filename=secure_filename(file.filename),
-                file_path=file_path,
-                width=width,
-                height=height,
-                file_size=os.path.getsize(file_path),
-                uploader_name=nickname,
-                upload_source='mobile'
-            )
-            db.session.add(image)
-            uploaded.append({
+            filename, content_hash = save_uploaded_file(file, project.id)
+            saved.append({
                 'filename': filename,
-                'uploader': nickname
+                'original_filename': secure_filename(file.filename),
+                'content_hash': content_hash
             })
 
-    db.session.commit()
+    # Images are added by the ingestion worker once the files are probed
+    batch = ingest.submit(project, saved, upload_source='mobile', uploader_name=nickname)
 
     return jsonify({
         'success': True,
-        'uploaded': len(uploaded),
-        'files': uploaded
-    })
+        'uploaded': len(saved),
+        'files': [{'filename': f['filename'], 'uploader': nickname} for f in saved],
+        'batch': batch.to_dict()
+    }), 202
+
+
+def _get_upload(project_id: int, upload_id: str) -> ChunkedUpload:
+    return ChunkedUpload.query.filter_by(id=upload_id, project_id=project_id).first_or_404()
+
+
+def _upload_response(upload: ChunkedUpload) -> dict:
+    data = upload.to_dict(offset=chunked_uploads.offset(upload))
+    data['chunk_size'] = chunked_uploads.chunk_size
+    return data
+
+
+@qr_bp.route('/project/<int:project_id>/uploads', methods=['POST'])
+def create_chunked_upload(project_id):
+    """
+    Start a resumable upload of one file
+
+    Body: {filename, size, nickname}; the filename must have an allowed
+    image extension. Send the file with PUT
+    .../uploads/<id>?offset=N in chunks of about chunk_size bytes, then POST
+    .../uploads/<id>/finalize. After a dropped connection, GET .../uploads/<id>
+    returns the offset to continue from.
+    """
+    project = Project.query.get_or_404(project_id)
+    data = request.get_json() or {}
+
+    size = data.get('size')
+    if not isinstance(size, int) or size <= 0:
+        return jsonify({'error': 'File size is required'}), 400
+    if size > current_app.config['MAX_CONTENT_LENGTH']:
+        return jsonify({'error': 'File is too large'}), 413
+
+    filename = secure_filename(data.get('filename') or '')
+    if not allowed_file(filename):
+        return jsonify({'error': 'File type not allowed'}), 400
+
+    upload = chunked_uploads.create(
+        project,
+        filename,
+        size,
+        uploader_name=data.get('nickname') or '匿名'
+    )
+    return jsonify(_upload_response(upload)), 201
+
+
+@qr_bp.route('/project/<int:project_id>/uploads/<upload_id>', methods=['GET'])
+def get_chunked_upload(project_id, upload_id):
+    """Get the offset to resume an upload from"""
+    upload = _get_upload(project_id, upload_id)
+    return jsonify(_upload_response(upload))
+
+
+@qr_bp.route('/project/<int:project_id>/uploads/<upload_id>', methods=['PUT'])
+def append_chunk(project_id, upload_id):
+    """Append the raw request body at ?offset="""
+    upload = _get_upload(project_id, upload_id)
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'error': 'Offset is required'}), 400
+
+    try:
+        new_offset = chunked_uploads.append(upload, offset, request.stream)
+    except UploadOffsetError as e:
+        return jsonify({'error': str(e), 'offset': e.offset}), 409
+    except ValueError as e:
+        return jsonify({'error': str(e), 'offset': chunked_uploads.offset(upload)}), 400
+
+    return jsonify({'offset': new_offset, 'size': upload.total_size})
+
+
+@qr_bp.route('/project/<int:project_id>/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_chunked_upload(project_id, upload_id):
+    """Finish an upload; body may carry the client's {sha256} to verify"""
+    upload = _get_upload(project_id, upload_id)
+    data = request.get_json(silent=True) or {}
+
+    try:
+        batch = chunked_uploads.finalize(upload, data.get('sha256'))
+    except UploadOffsetError as e:
+        return jsonify({'error': 'Upload is incomplete', 'offset': e.offset}), 409
+    except ValueError as e:
+        return jsonify({'error': str(e), 'offset': 0}), 400
+
+    return jsonify({
+        'success': True,
+        'filename': upload.filename,
+        'batch': batch.to_dict()
+    }), 202
 
 
 @qr_bp.route('/project/<int:project_id>/stats', methods=['GET'])
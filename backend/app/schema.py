@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Schema Migrations
+
+db.create_all() creates missing tables but leaves existing ones alone, so
+columns, indexes and data changes made after a database was created are
+applied by versioned migrations (backend/migrations). upgrade_schema() runs
+the ones a database has not seen yet, in version order, and records each in
+the schema_migrations table.
+
+SQLite runs DDL outside of transactions, so a migration interrupted half way
+is run again from the start: migrations must be safe to repeat. The helpers
+below skip columns and indexes that already exist.
+"""
+from datetime import datetime
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection
+from app.extensions import db
+
+
+MIGRATION_TABLE = 'schema_migrations'
+
+
+def _table(table_name: str):
+    return db.metadata.tables[table_name]
+
+
+def add_column(conn: Connection, table_name: str, column_name: str) -> bool:
+    """
+    Add a model column to an existing table (nullable, existing rows get NULL)
+
+    Returns:
+        Whether the column was added
+    """
+    columns = {c['name'] for c in inspect(conn).get_columns(table_name)}
+    if column_name in columns:
+        return False
+    column = _table(table_name).columns[column_name]
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.exec_driver_sql(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}')
+    return True
+
+
+def create_index(conn: Connection, table_name: str, index_name: str) -> bool:
+    """
+    Create an index declared on a model if the table does not have it
+
+    Returns:
+        Whether the index was created
+    """
+    indexes = {i['name'] for i in inspect(conn).get_indexes(table_name)}
+    if index_name in indexes:
+        return False
+    index = next(i for i in _table(table_name).indexes if i.name == index_name)
+    index.create(conn)
+    return True
+
+
+def current_version() -> int:
+    """Highest applied migration version, 0 for a database without any (needs app context)"""
+    with db.engine.connect() as conn:
+        if not inspect(conn).has_table(MIGRATION_TABLE):
+            return 0
+        return conn.exec_driver_sql(f'SELECT MAX(version) FROM {MIGRATION_TABLE}').scalar() or 0
+
+
+def upgrade_schema() -> int:
+    """
+    Apply pending migrations (needs app context, run after db.create_all())
+
+    Returns:
+        Number of migrations applied
+    """
+    from migrations import MIGRATIONS
+
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql(
+            f'CREATE TABLE IF NOT EXISTS {MIGRATION_TABLE} '
+            '(version INTEGER PRIMARY KEY, description VARCHAR(255), applied_at DATETIME)'
+        )
+        applied = {version for (version,) in conn.exec_driver_sql(f'SELECT version FROM {MIGRATION_TABLE}')}
+
+    count = 0
+    for migration in sorted(MIGRATIONS, key=lambda m: m.VERSION):
+        if migration.VERSION in applied:
+            continue
+        with db.engine.begin() as conn:
+            migration.upgrade(conn)
+            conn.exec_driver_sql(
+                f'INSERT INTO {MIGRATION_TABLE} (version, description, applied_at) VALUES (?, ?, ?)',
+                (migration.VERSION, migration.DESCRIPTION, datetime.utcnow())
+            )
+        print(f"Applied migration {migration.VERSION}: {migration.DESCRIPTION}")
+        count += 1
+    return count
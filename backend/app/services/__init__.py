@@ -4,5 +4,20 @@ Business Logic Services
 """
 from .exporter import DatasetExporter
 from .augmentation import Augmentor
+from .project_exporter import ProjectExporter
+from .export_data import ExportData, load_export_data
+from .export_jobs import ExportJobQueue, export_jobs
+from .augment_cache import AugmentationCache, augment_cache
+from .thumbnails import ThumbnailService, thumbnails
+from .ingest import IngestQueue, ingest, probe_image
+from .chunked_upload import ChunkedUploadService, UploadOffsetError, chunked_uploads
+from .storage_migration import migrate_to_blobs
+from .reclaim import FileReclaimer, reclaimer
+from .deletion import delete_images, delete_project
+from .annotation_counts import adjust_annotation_counts, recount_annotations
 
-__all__ = ['DatasetExporter', 'Augmentor']
+__all__ = ['DatasetExporter', 'Augmentor', 'ProjectExporter', 'ExportData', 'load_export_data',
+           'ExportJobQueue', 'export_jobs', 'AugmentationCache', 'augment_cache', 'ThumbnailService',
+           'thumbnails', 'IngestQueue', 'ingest', 'probe_image', 'ChunkedUploadService',
+           'UploadOffsetError', 'chunked_uploads', 'migrate_to_blobs', 'FileReclaimer', 'reclaimer',
+           'delete_images', 'delete_project', 'adjust_annotation_counts', 'recount_annotations']
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Annotation Counts
+
+Image.annotation_count mirrors the number of annotation rows of an image,
+so image listings do not count annotations per image. Everything that adds
+or removes annotations updates it in the same transaction; changes are
+applied as relative UPDATEs so concurrent saves do not overwrite each other.
+recount_annotations() repairs counts that drifted, e.g. after annotations
+were changed with plain SQL.
+"""
+from typing import Dict, Optional
+from app.extensions import db
+from app.models import Annotation, Image
+
+
+def adjust_annotation_counts(deltas: Dict[int, int]):
+    """
+    Add to the annotation counts of images (committed by the caller)
+
+    Args:
+        deltas: image id -> number of annotations added (negative for removed)
+    """
+    rows = [{'image_id': image_id, 'delta': delta} for image_id, delta in deltas.items() if delta]
+    if not rows:
+        return
+    statement = db.update(Image).where(Image.id == db.bindparam('image_id')).values(
+        annotation_count=db.func.coalesce(Image.annotation_count, 0) + db.bindparam('delta')
+    )
+    db.session.connection().execute(statement, rows)
+
+
+def recount_annotations(project_id: Optional[int] = None) -> int:
+    """
+    Recompute annotation counts from the annotations table (needs app context)
+
+    One UPDATE statement; each image's count is read from the
+    (image_id, class_id) index.
+
+    Args:
+        project_id: Only repair this project
+
+    Returns:
+        Number of images whose count was wrong
+    """
+    counts = db.select(db.func.count(Annotation.id)).where(
+        Annotation.image_id == Image.id
+    ).scalar_subquery()
+    statement = db.update(Image).where(Image.annotation_count.is_distinct_from(counts))
+    if project_id is not None:
+        statement = statement.where(Image.project_id == project_id)
+
+    result = db.session.execute(statement.values(annotation_count=counts),
+                                execution_options={'synchronize_session': False})
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Augmentation Result Cache
+
+Seeded augmentation is deterministic, so an augmented sample only depends on
+the source file content, the augmentation settings, the seed, the image id
+the per-sample generator is derived from and the sample index. Encoded
+samples and their labels are kept on disk under that key and re-exports copy
+them instead of decoding, augmenting and encoding again.
+
+The cache is bounded by total size; the least recently used entries are
+evicted first.
+"""
+import os
+import json
+import hashlib
+import threading
+from typing import Any, Dict, Optional, Tuple
+from flask import Flask
+
+
+CACHE_VERSION = 1  # Bump when augmentation output changes for the same key
+
+# Config keys that do not change the pixels or labels of a single sample
+_IGNORED_CONFIG_KEYS = {'seed', 'multiplier', 'splits'}
+
+
+class AugmentationCache:
+    """Size-bounded LRU cache of augmented samples stored under DATA_DIR"""
+
+    def __init__(self, app: Flask = None):
+        self.root = None
+        self.max_bytes = 0
+        self._total = None  # Bytes on disk, counted on first write
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        self.max_bytes = app.config.get('AUGMENT_CACHE_MAX_BYTES', 0) or 0
+        self.root = app.config['AUGMENT_CACHE_FOLDER']
+        self._total = None
+        if self.enabled:
+            os.makedirs(self.root, exist_ok=True)
+        app.extensions['augment_cache'] = self
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root) and self.max_bytes > 0
+
+    @staticmethod
+    def make_key(namespace: str, file_hash: str, config: Dict[str, Any], seed: int,
+                 image_id: int, aug_idx: int, labels: Any = None) -> str:
+        """
+        Cache key of one augmented sample
+
+        Args:
+            namespace: Which augmentation pipeline produced the sample
+            file_hash: Content hash of the source image
+            config: Augmentation settings (key order does not matter)
+            seed: Augmentation seed
+            image_id: Image the sample generator was derived for
+            aug_idx: Sample index for this source image
+            labels: Source labels the cached labels were derived from, if any
+        """
+        normalized = {k: v for k, v in config.items() if k not in _IGNORED_CONFIG_KEYS}
+        raw = json.dumps([CACHE_VERSION, namespace, file_hash, normalized, seed, image_id, aug_idx, labels],
+                         sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f'{key}.bin')
+
+    def get(self, key: str) -> Optional[Tuple[bytes, Any]]:
+        """
+        Look up a sample and mark it as recently used
+
+        Returns:
+            (data, labels) or None on a miss
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                header = f.readline()
+                data = f.read()
+            os.utime(path)
+            return data, json.loads(header)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, data: bytes, labels: Any):
+        """Store a sample with its JSON-serializable labels"""
+        path = self._path(key)
+        # The header is a single JSON line in front of the encoded image
+        payload = json.dumps(labels, ensure_ascii=False).encode('utf-8') + b'\n' + data
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            replaced = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Augmentation cache write failed: {e}")
+            return
+
+        with self._lock:
+            if self._total is None:
+                self._total = self._scan_size()
+            else:
+                self._total += len(payload) - replaced
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def clear(self) -> int:
+        """Remove every entry, returns the number of entries removed"""
+        with self._lock:
+            removed = 0
+            for path, _, _ in self._entries():
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+            self._total = 0
+            return removed
+
+    def _entries(self):
+        """(path, size, last used) of every entry on disk"""
+        if not self.root or not os.path.isdir(self.root):
+            return
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.bin'):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    yield entry.path, st.st_size, st.st_mtime
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is at 90% of its limit"""
+        target = self.max_bytes * 0.9
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._total = total
+
+
+augment_cache = AugmentationCache()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Augmentation Worker Pool
+
+Fans CPU-heavy augmentation tasks (decode, transform, JPEG encode) out to a
+process pool while the exporter keeps writing the archive. At most
+max_in_flight items are pending at any time, so results never pile up in
+memory, and results come back in submission order.
+
+Worker processes are started once and shared by all exports of the server
+process, so small exports do not pay the process start-up cost every time.
+The 'thread' backend runs tasks on threads instead: cv2 and PIL release the
+GIL in their heavy calls, and nothing has to be pickled between processes.
+"""
+import os
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple
+
+
+def _init_worker():
+    """Keep each worker single-threaded; the pool provides the parallelism"""
+    try:
+        import cv2
+        cv2.setNumThreads(1)
+    except ImportError:
+        pass
+
+
+_executors = {}  # backend -> (workers, executor)
+_executor_lock = threading.Lock()
+
+
+def _shared_executor(workers: int, backend: str = 'process') -> Executor:
+    """Pool shared by all exports, (re)created when the size changes"""
+    with _executor_lock:
+        current = _executors.get(backend)
+        if current is None or current[0] != workers:
+            if current is not None:
+                current[1].shutdown(wait=False)
+            if backend == 'thread':
+                executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='augment')
+            else:
+                # spawn: the server process is multi-threaded, forking it is not safe
+                executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker
+                )
+            _executors[backend] = current = (workers, executor)
+        return current[1]
+
+
+class AugmentationPool:
+    """Ordered, bounded process pool for augmentation tasks"""
+
+    def __init__(self, workers: Optional[int] = None, max_in_flight: Optional[int] = None,
+                 backend: str = 'process'):
+        """
+        Args:
+            workers: Number of workers (default: CPU count).
+                With 1 worker, tasks run inline in the calling thread.
+            max_in_flight: Maximum submitted but not yet consumed items
+                (default: 2 per worker)
+            backend: 'process' or 'thread'
+        """
+        if backend not in ('process', 'thread'):
+            raise ValueError(f"Unknown augmentation backend: {backend}")
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.max_in_flight = max(1, max_in_flight or self.workers * 2)
+        self.backend = backend
+
+    @classmethod
+    def from_config(cls, config) -> 'AugmentationPool':
+        """Create a pool from EXPORT_AUGMENT_WORKERS / _IN_FLIGHT / _BACKEND"""
+        return cls(config.get('EXPORT_AUGMENT_WORKERS'), config.get('EXPORT_AUGMENT_IN_FLIGHT'),
+                   config.get('EXPORT_AUGMENT_BACKEND', 'process'))
+
+    def imap(self, func: Callable, items: Iterable[Tuple[Any, Optional[tuple]]]
+             ) -> Iterator[Tuple[Any, Any, Optional[Exception]]]:
+        """
+        Run func(*args) for each (key, args) item, in order
+
+        Items whose args are None have nothing to compute and pass straight
+        through, still in order.
+
+        Yields:
+            (key, result, error) - error is the exception raised by func, if any
+        """
+        if self.workers <= 1:
+            for key, args in items:
+                if args is None:
+                    yield key, None, None
+                    continue
+                try:
+                    result, error = func(*args), None
+                except Exception as e:
+                    result, error = None, e
+                yield key, result, error
+            return
+
+        executor = _shared_executor(self.workers, self.backend)
+        pending = deque()
+        try:
+            for key, args in items:
+                future = executor.submit(func, *args) if args is not None else None
+                pending.append((key, future))
+                if len(pending) >= self.max_in_flight:
+                    yield self._collect(*pending.popleft())
+
+            while pending:
+                yield self._collect(*pending.popleft())
+        finally:
+            # Export aborted: drop work that has not started yet
+            for _, future in pending:
+                if future is not None:
+                    future.cancel()
+
+    @staticmethod
+    def _collect(key, future) -> Tuple[Any, Any, Optional[Exception]]:
+        if future is None:
+            return key, None, None
+        try:
+            return key, future.result(), None
+        except Exception as e:
+            return key, None, e
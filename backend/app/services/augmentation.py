@@ -4,8 +4,30 @@ Data Augmentation Service
 """
 import cv2
 import numpy as np
-import random
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional, Sequence, Union
+
+
+_IDENTITY_LUT = np.arange(256, dtype=np.float64)
+
+
+def _scale_lut(factor: Optional[float]) -> np.ndarray:
+    """uint8 lookup table multiplying values by factor (identity for None)"""
+    if factor is None:
+        return _IDENTITY_LUT.astype(np.uint8)
+    return np.clip(_IDENTITY_LUT * factor, 0, 255).astype(np.uint8)
+
+
+def sample_rng(seed: Optional[int], image_id: int, aug_idx: int) -> np.random.Generator:
+    """
+    Random generator for one augmented sample
+
+    Every (seed, image id, aug index) gets its own independent stream, so a
+    sample comes out the same no matter which worker or run produces it.
+    Without a seed the generator is seeded from the OS.
+    """
+    if seed is None:
+        return np.random.default_rng()
+    return np.random.default_rng(np.random.SeedSequence([int(seed), int(image_id), int(aug_idx)]))
 
 
 class Augmentor:
@@ -25,184 +47,468 @@ class Augmentor:
                 - contrast: bool, contrast_range: tuple (0.7, 1.3)
                 - gaussian_noise: bool, noise_sigma: int
                 - blur: bool, blur_radius: int
+                - mosaic: bool, mosaic_prob: float (default 1.0), 2x2 mosaic of
+                  the image and three partner images, see combine()
+                - mixup: bool, mixup_prob: float (default 0.5), mixup_alpha:
+                  float (default 32.0), blend with a partner image
+                - min_box_size: float, boxes narrower or shorter than this
+                  (in pixels) after clipping to the image are dropped from
+                  every sample, transformed or not (default 1)
+                - seed: int, base seed for sample_rng() (read by the callers)
         """
         self.config = config
 
-    def augment(self, image: np.ndarray, annotations: List[Dict]) -> Tuple[np.ndarray, List[Dict]]:
+    @property
+    def needs_partners(self) -> bool:
+        """Whether samples are combined from several images (mosaic, mixup)"""
+        return bool(self.config.get('mosaic') or self.config.get('mixup'))
+
+    def combine(self, image: np.ndarray, annotations: List[Dict],
+                partners: Sequence[Tuple[np.ndarray, List[Dict]]],
+                rng: np.random.Generator) -> Tuple[np.ndarray, List[Dict]]:
+        """
+        Apply the enabled multi-image augmentations to one sample
+
+        Meant to run before augment()/augment_batch() with the same generator.
+        The result keeps the size of image, so it can be batched with other
+        samples of the same source.
+
+        Args:
+            image: Source image (BGR)
+            annotations: Annotations of the source
+            partners: Decoded (image, annotations) pairs to combine with
+                (the source itself is used when there are none)
+            rng: Sample generator
+
+        Returns:
+            (image, annotations) - the source itself when nothing was applied
+        """
+        img, annos = image, annotations
+        pool = list(partners) or [(image, annotations)]
+
+        if self.config.get('mosaic') and rng.random() < self.config.get('mosaic_prob', 1.0):
+            picks = rng.choice(len(pool), 3, replace=len(pool) < 3)
+            img, annos = self.mosaic([(img, annos)] + [pool[i] for i in picks], rng)
+
+        if self.config.get('mixup') and rng.random() < self.config.get('mixup_prob', 0.5):
+            other_img, other_annos = pool[rng.integers(len(pool))]
+            img, annos = self.mixup(img, annos, other_img, other_annos, rng)
+
+        return img, annos
+
+    def mosaic(self, tiles: Sequence[Tuple[np.ndarray, List[Dict]]], rng: np.random.Generator,
+               out: Optional[np.ndarray] = None) -> Tuple[np.ndarray, List[Dict]]:
+        """
+        Combine four images into one 2x2 mosaic the size of the first one
+
+        A random center splits the canvas into four quadrants. Each tile is
+        cropped at its corner facing the center to the quadrant's aspect
+        ratio and resized once into the canvas. The boxes of all tiles are
+        remapped, clipped and filtered together; only bbox annotations are
+        carried over.
+
+        Args:
+            tiles: Four (image, annotations) pairs
+            rng: Sample generator
+            out: Optional canvas to draw into (same shape as the first image)
+
+        Returns:
+            (mosaic image, annotations)
+        """
+        shape = tiles[0][0].shape
+        h, w = shape[:2]
+        canvas = np.empty(shape, dtype=np.uint8) if out is None else out
+
+        cx = int(round(rng.uniform(0.25, 0.75) * w))
+        cy = int(round(rng.uniform(0.25, 0.75) * h))
+        quadrants = [(0, 0, cx, cy), (cx, 0, w, cy), (0, cy, cx, h), (cx, cy, w, h)]
+        # Which source edges touch the center: (right, bottom) per quadrant
+        anchors = [(True, True), (False, True), (True, False), (False, False)]
+
+        annos, boxes, params = [], [], []
+        for (img, tile_annos), (x0, y0, x1, y1), (right, bottom) in zip(tiles, quadrants, anchors):
+            qw, qh = x1 - x0, y1 - y0
+            if qw <= 0 or qh <= 0:
+                continue
+
+            # Largest crop with the quadrant's aspect ratio
+            th, tw = img.shape[:2]
+            scale = max(qw / tw, qh / th)
+            cw = min(tw, max(1, int(round(qw / scale))))
+            ch = min(th, max(1, int(round(qh / scale))))
+            sx0 = tw - cw if right else 0
+            sy0 = th - ch if bottom else 0
+
+            crop = img[sy0:sy0 + ch, sx0:sx0 + cw]
+            interpolation = cv2.INTER_AREA if cw > qw else cv2.INTER_LINEAR
+            canvas[y0:y1, x0:x1] = cv2.resize(crop, (qw, qh), interpolation=interpolation)
+
+            box_idx, tile_boxes = self._to_box_array(tile_annos)
+            annos.extend(tile_annos[i] for i in box_idx)
+            boxes.append(tile_boxes)
+            # Per box: source offset, scale, destination offset, quadrant bounds
+            params.append(np.tile([sx0, sy0, qw / cw, qh / ch, x0, y0, x0, y0, x1, y1],
+                                  (len(box_idx), 1)))
+
+        if not annos:
+            return canvas, []
+
+        boxes = np.concatenate(boxes)
+        params = np.concatenate(params)
+        src_off, scale, dst_off = params[:, 0:2], params[:, 2:4], params[:, 4:6]
+        lo, hi = params[:, 6:8], params[:, 8:10]
+
+        mins = np.clip((boxes[:, :2] - src_off) * scale + dst_off, lo, hi)
+        maxs = np.clip((boxes[:, :2] + boxes[:, 2:] - src_off) * scale + dst_off, lo, hi)
+        return canvas, self._boxes_to_annos(annos, mins, maxs)
+
+    def mixup(self, image: np.ndarray, annotations: List[Dict], other: np.ndarray,
+              other_annotations: List[Dict], rng: np.random.Generator,
+              out: Optional[np.ndarray] = None) -> Tuple[np.ndarray, List[Dict]]:
+        """
+        Blend two images and keep the boxes of both
+
+        The blend ratio is drawn from Beta(mixup_alpha, mixup_alpha). other is
+        resized once to the size of image when they differ.
+
+        Returns:
+            (blended image, annotations of both images)
+        """
+        h, w = image.shape[:2]
+        oh, ow = other.shape[:2]
+        alpha = self.config.get('mixup_alpha', 32.0)
+        ratio = rng.beta(alpha, alpha)
+
+        if (oh, ow) != (h, w):
+            other = cv2.resize(other, (w, h), interpolation=cv2.INTER_LINEAR)
+        if other.shape != image.shape:
+            raise ValueError("Images for mixup must have the same number of channels")
+        blended = cv2.addWeighted(image, ratio, other, 1 - ratio, 0, dst=out)
+
+        box_idx, boxes = self._to_box_array(other_annotations)
+        other_annos = [other_annotations[i] for i in box_idx]
+        if other_annos:
+            scale = np.array([w / ow, h / oh])
+            mins = np.clip(boxes[:, :2] * scale, 0, [w, h])
+            maxs = np.clip((boxes[:, :2] + boxes[:, 2:]) * scale, 0, [w, h])
+            other_annos = self._boxes_to_annos(other_annos, mins, maxs)
+
+        return blended, [a.copy() for a in annotations] + other_annos
+
+    def augment(self, image: np.ndarray, annotations: List[Dict],
+                rng: Optional[np.random.Generator] = None) -> Tuple[np.ndarray, List[Dict]]:
         """
         Apply augmentation to image and adjust annotations
 
         Args:
             image: OpenCV format image (BGR)
             annotations: List of annotation dicts with 'bbox': [x, y, w, h]
+            rng: Generator all random parameters are drawn from, see
+                sample_rng() (default: a fresh OS-seeded generator)
 
         Returns:
-            (augmented_image, adjusted_annotations)
+            (augmented_image, adjusted_annotations) - boxes smaller than
+            min_box_size after clipping to the image are left out
         """
-        img = image.copy()
-        annos = [a.copy() for a in annotations]
+        images, annos = self.augment_batch(image, annotations, [rng])
+        return images[0], annos[0]
 
-        # Geometric transforms (require annotation adjustment)
-        if self.config.get('horizontal_flip') and random.random() < 0.5:
-            img, annos = self._horizontal_flip(img, annos)
+    def augment_batch(self, images: Union[np.ndarray, Sequence[np.ndarray]],
+                      annotations: Union[List[Dict], Sequence[List[Dict]]],
+                      rngs: Sequence[Optional[np.random.Generator]],
+                      out: Optional[np.ndarray] = None) -> Tuple[np.ndarray, List[List[Dict]]]:
+        """
+        Produce several augmented samples in one call
 
-        if self.config.get('vertical_flip') and random.random() < 0.5:
-            img, annos = self._vertical_flip(img, annos)
+        Either one decoded source is augmented once per generator in rngs, or
+        a list of same-size images is augmented pairwise with rngs. Samples
+        are written into one preallocated (N, H, W, C) array and the scratch
+        buffers of the color and noise passes are shared between samples.
 
-        if self.config.get('rotation'):
-            angle = random.uniform(*self.config.get('rotation_range', (-15, 15)))
-            img, annos = self._rotate(img, annos, angle)
+        Args:
+            images: One source image (H, W, C), or N images of the same size
+            annotations: Annotations of the source, or one list per image
+            rngs: One generator per sample (None entries get an OS-seeded one)
+            out: Optional (N, H, W, C) uint8 array to write the samples into
 
-        if self.config.get('scale'):
-            factor = random.uniform(*self.config.get('scale_range', (0.8, 1.2)))
-            img, annos = self._scale(img, annos, factor)
+        Returns:
+            (samples as an (N, H, W, C) array, adjusted annotations per sample)
+        """
+        count = len(rngs)
+        shared = isinstance(images, np.ndarray) and images.ndim in (2, 3)
+        if shared:
+            sources = [images] * count
+            annotation_lists = [annotations] * count
+        else:
+            sources, annotation_lists = list(images), list(annotations)
+            if not (len(sources) == len(annotation_lists) == count):
+                raise ValueError("images, annotations and rngs must have the same length")
+
+        shape = sources[0].shape if sources else (0, 0, 3)
+        if any(src.shape != shape for src in sources):
+            raise ValueError("All images in a batch must have the same size")
+
+        if out is None:
+            out = np.empty((count,) + shape, dtype=np.uint8)
+        elif out.shape != (count,) + shape or out.dtype != np.uint8:
+            raise ValueError(f"out must be a uint8 array of shape {(count,) + shape}")
+
+        # Per-batch work: box arrays (once for a shared source) and scratch buffers
+        buffers = _Buffers(shape)
+        box_arrays = {}
+        results = []
+
+        for i, (src, annos, rng) in enumerate(zip(sources, annotation_lists, rngs)):
+            if rng is None:
+                rng = np.random.default_rng()
+            if id(annos) not in box_arrays:
+                box_arrays[id(annos)] = self._to_box_array(annos)
+            box_idx, boxes = box_arrays[id(annos)]
+            results.append(self._augment_into(src, annos, box_idx, boxes, rng, out[i], buffers))
+
+        return out, results
+
+    def _augment_into(self, src: np.ndarray, annotations: List[Dict], box_idx: List[int],
+                      boxes: np.ndarray, rng: np.random.Generator, dst: np.ndarray,
+                      buffers: '_Buffers') -> List[Dict]:
+        """Augment one sample from src into dst, returns its annotations"""
+        annos = [a.copy() for a in annotations]
 
-        # Color transforms (no annotation adjustment needed)
-        if self.config.get('brightness'):
-            img = self._adjust_brightness(img, self.config.get('brightness_range', (-0.2, 0.2)))
+        # Geometric transforms (require annotation adjustment): every sampled
+        # transform is composed into one matrix and the image is resampled once
+        h, w = src.shape[:2]
+        M = self._sample_geometry(w, h, rng)
+        if M is not None:
+            self._warp(src, M, dst)
+        else:
+            np.copyto(dst, src)
 
-        if self.config.get('contrast'):
-            img = self._adjust_contrast(img, self.config.get('contrast_range', (0.8, 1.2)))
+        # All boxes go through the matrix together as one (N, 4) array; they are
+        # clipped and filtered by min_box_size even when no transform was sampled
+        if len(box_idx):
+            new_boxes, keep = self._transform_boxes(boxes, np.eye(3) if M is None else M, w, h)
+            annos = self._from_box_array(annos, box_idx, new_boxes, keep)
 
-        if self.config.get('saturation'):
-            img = self._adjust_saturation(img, self.config.get('saturation_range', (0.8, 1.2)))
+        # Color transforms (no annotation adjustment needed): brightness,
+        # saturation and contrast are applied as lookup tables
+        self._adjust_color(dst, rng, buffers)
 
         if self.config.get('gaussian_noise'):
-            img = self._add_gaussian_noise(img, self.config.get('noise_sigma', 10))
+            self._add_gaussian_noise(dst, self.config.get('noise_sigma', 10), rng, buffers)
 
         if self.config.get('blur'):
-            img = self._apply_blur(img, self.config.get('blur_radius', 3))
+            self._apply_blur(dst, self.config.get('blur_radius', 3))
 
-        return img, annos
+        return annos
 
-    def _horizontal_flip(self, img: np.ndarray, annos: List[Dict]) -> Tuple[np.ndarray, List[Dict]]:
-        """Horizontal flip"""
-        h, w = img.shape[:2]
-        img = cv2.flip(img, 1)
+    def _sample_geometry(self, w: int, h: int, rng: np.random.Generator) -> Optional[np.ndarray]:
+        """
+        Sample the enabled geometric transforms and compose them
 
-        for anno in annos:
-            if 'bbox' in anno:
-                x, y, bw, bh = anno['bbox']
-                anno['bbox'] = [w - x - bw, y, bw, bh]
+        Works in continuous image coordinates (pixel edges at integers), the
+        same space as bbox coordinates. Transforms apply in the order
+        horizontal flip, vertical flip, rotation, scale.
 
-        return img, annos
+        Returns:
+            3x3 affine matrix, or None when no transform was sampled
+        """
+        M = np.eye(3)
+        changed = False
 
-    def _vertical_flip(self, img: np.ndarray, annos: List[Dict]) -> Tuple[np.ndarray, List[Dict]]:
-        """Vertical flip"""
-        h, w = img.shape[:2]
-        img = cv2.flip(img, 0)
+        if self.config.get('horizontal_flip') and rng.random() < 0.5:
+            M = np.array([[-1, 0, w], [0, 1, 0], [0, 0, 1]], dtype=np.float64) @ M
+            changed = True
 
-        for anno in annos:
-            if 'bbox' in anno:
-                x, y, bw, bh = anno['bbox']
-                anno['bbox'] = [x, h - y - bh, bw, bh]
+        if self.config.get('vertical_flip') and rng.random() < 0.5:
+            M = np.array([[1, 0, 0], [0, -1, h], [0, 0, 1]], dtype=np.float64) @ M
+            changed = True
 
-        return img, annos
+        if self.config.get('rotation'):
+            angle = rng.uniform(*self.config.get('rotation_range', (-15, 15)))
+            R = np.vstack([cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0), [0, 0, 1]])
+            M = R @ M
+            changed = True
 
-    def _rotate(self, img: np.ndarray, annos: List[Dict], angle: float) -> Tuple[np.ndarray, List[Dict]]:
-        """Rotate image and annotations"""
+        if self.config.get('scale'):
+            factor = rng.uniform(*self.config.get('scale_range', (0.8, 1.2)))
+            # Scale about the center: zoom in crops, zoom out pads (reflected border)
+            S = np.array([
+                [factor, 0, (1 - factor) * w / 2],
+                [0, factor, (1 - factor) * h / 2],
+                [0, 0, 1]
+            ], dtype=np.float64)
+            M = S @ M
+            changed = True
+
+        return M if changed else None
+
+    def _warp(self, img: np.ndarray, M: np.ndarray, dst: np.ndarray):
+        """Apply a composed affine matrix to the image in a single pass, into dst"""
         h, w = img.shape[:2]
-        center = (w // 2, h // 2)
 
-        M = cv2.getRotationMatrix2D(center, angle, 1.0)
-        img = cv2.warpAffine(img, M, (w, h), borderMode=cv2.BORDER_REFLECT)
+        # Pure flips map pixels exactly, no resampling needed
+        A = M[:2, :2]
+        if np.allclose(np.abs(A), np.eye(2)) and np.allclose(A, np.diag(np.diag(A))):
+            flip_x, flip_y = A[0, 0] < 0, A[1, 1] < 0
+            if flip_x or flip_y:
+                cv2.flip(img, -1 if flip_x and flip_y else (1 if flip_x else 0), dst=dst)
+            else:
+                np.copyto(dst, img)
+            return
+
+        # Convert from continuous coordinates to pixel-center indices
+        offset = A @ np.array([0.5, 0.5]) + M[:2, 2] - 0.5
+        M_idx = np.hstack([A, offset.reshape(2, 1)])
+        cv2.warpAffine(img, M_idx, (w, h), dst=dst, flags=cv2.INTER_LINEAR,
+                       borderMode=cv2.BORDER_REFLECT)
+
+    @staticmethod
+    def _to_box_array(annos: List[Dict]) -> Tuple[List[int], np.ndarray]:
+        """Collect the bboxes of annotations into an (N, 4) float array of x, y, w, h"""
+        box_idx = [i for i, anno in enumerate(annos) if 'bbox' in anno]
+        boxes = np.array([annos[i]['bbox'] for i in box_idx], dtype=np.float64).reshape(-1, 4)
+        return box_idx, boxes
+
+    @staticmethod
+    def _from_box_array(annos: List[Dict], box_idx: List[int], boxes: np.ndarray,
+                        keep: np.ndarray) -> List[Dict]:
+        """Write transformed boxes back, dropping annotations whose box was discarded"""
+        dropped = set()
+        for row, i in enumerate(box_idx):
+            if keep[row]:
+                annos[i]['bbox'] = boxes[row].tolist()
+            else:
+                dropped.add(i)
+        if not dropped:
+            return annos
+        return [anno for i, anno in enumerate(annos) if i not in dropped]
+
+    def _boxes_to_annos(self, annos: List[Dict], mins: np.ndarray, maxs: np.ndarray) -> List[Dict]:
+        """Copies of annos with boxes set from corner arrays, degenerate boxes dropped"""
+        sizes = maxs - mins
+        keep = (sizes >= self.config.get('min_box_size', 1.0)).all(axis=1)
+        result = []
+        for row in np.flatnonzero(keep):
+            anno = annos[row].copy()
+            anno['bbox'] = [float(mins[row, 0]), float(mins[row, 1]),
+                            float(sizes[row, 0]), float(sizes[row, 1])]
+            result.append(anno)
+        return result
+
+    def _transform_boxes(self, boxes: np.ndarray, M: np.ndarray, img_w: int,
+                         img_h: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Transform all boxes with one matrix multiply
 
-        for anno in annos:
-            if 'bbox' in anno:
-                anno['bbox'] = self._rotate_bbox(anno['bbox'], M, w, h)
+        Each box's four corners are mapped through M, the axis-aligned hull is
+        taken and clipped to the image.
 
-        return img, annos
+        Returns:
+            (boxes as (N, 4) x, y, w, h, keep mask of non-degenerate boxes)
+        """
+        x, y, w, h = boxes.T
+        x2, y2 = x + w, y + h
 
-    def _rotate_bbox(self, bbox: List[float], M: np.ndarray, img_w: int, img_h: int) -> List[float]:
-        """Rotate bounding box and get new axis-aligned bbox"""
-        x, y, w, h = bbox
-
-        # Get corners
-        corners = np.array([
-            [x, y],
-            [x + w, y],
-            [x + w, y + h],
-            [x, y + h]
-        ], dtype=np.float32)
-
-        # Transform corners
-        ones = np.ones((4, 1))
-        corners_h = np.hstack([corners, ones])
-        rotated = M @ corners_h.T
-        rotated = rotated.T
-
-        # Get new bounding box
-        x_min = max(0, rotated[:, 0].min())
-        y_min = max(0, rotated[:, 1].min())
-        x_max = min(img_w, rotated[:, 0].max())
-        y_max = min(img_h, rotated[:, 1].max())
-
-        return [x_min, y_min, x_max - x_min, y_max - y_min]
-
-    def _scale(self, img: np.ndarray, annos: List[Dict], factor: float) -> Tuple[np.ndarray, List[Dict]]:
-        """Scale image and annotations"""
-        h, w = img.shape[:2]
-        new_h, new_w = int(h * factor), int(w * factor)
+        # Corners as (N, 4, 3) homogeneous points
+        corners = np.empty((len(boxes), 4, 3))
+        corners[:, :, 0] = np.stack([x, x2, x2, x], axis=1)
+        corners[:, :, 1] = np.stack([y, y, y2, y2], axis=1)
+        corners[:, :, 2] = 1.0
 
-        img = cv2.resize(img, (new_w, new_h))
+        transformed = corners @ M[:2].T  # (N, 4, 2)
+        mins = transformed.min(axis=1)
+        maxs = transformed.max(axis=1)
 
-        # Pad or crop to original size
-        if factor > 1:
-            # Crop center
-            start_x = (new_w - w) // 2
-            start_y = (new_h - h) // 2
-            img = img[start_y:start_y + h, start_x:start_x + w]
-            offset_x, offset_y = -start_x, -start_y
-        else:
-            # Pad
-            pad_x = (w - new_w) // 2
-            pad_y = (h - new_h) // 2
-            img = cv2.copyMakeBorder(img, pad_y, h - new_h - pad_y,
-                                     pad_x, w - new_w - pad_x,
-                                     cv2.BORDER_REFLECT)
-            offset_x, offset_y = pad_x, pad_y
-
-        for anno in annos:
-            if 'bbox' in anno:
-                x, y, bw, bh = anno['bbox']
-                anno['bbox'] = [
-                    x * factor + offset_x,
-                    y * factor + offset_y,
-                    bw * factor,
-                    bh * factor
-                ]
+        np.clip(mins, 0, [img_w, img_h], out=mins)
+        np.clip(maxs, 0, [img_w, img_h], out=maxs)
 
-        return img, annos
+        sizes = maxs - mins
+        min_size = self.config.get('min_box_size', 1.0)
+        keep = (sizes >= min_size).all(axis=1)
+
+        return np.hstack([mins, sizes]), keep
+
+    def _adjust_color(self, img: np.ndarray, rng: np.random.Generator, buffers: '_Buffers'):
+        """
+        Apply brightness, saturation and contrast in place, in as few passes as possible
 
-    def _adjust_brightness(self, img: np.ndarray, range_: Tuple[float, float]) -> np.ndarray:
-        """Adjust brightness"""
-        factor = random.uniform(*range_)
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV).astype(np.float32)
-        hsv[:, :, 2] = np.clip(hsv[:, :, 2] * (1 + factor), 0, 255)
-        return cv2.cvtColor(hsv.astype(np.uint8), cv2.COLOR_HSV2BGR)
-
-    def _adjust_contrast(self, img: np.ndarray, range_: Tuple[float, float]) -> np.ndarray:
-        """Adjust contrast"""
-        factor = random.uniform(*range_)
-        mean = np.mean(img)
-        return np.clip((img - mean) * factor + mean, 0, 255).astype(np.uint8)
-
-    def _adjust_saturation(self, img: np.ndarray, range_: Tuple[float, float]) -> np.ndarray:
-        """Adjust saturation"""
-        factor = random.uniform(*range_)
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV).astype(np.float32)
-        hsv[:, :, 1] = np.clip(hsv[:, :, 1] * factor, 0, 255)
-        return cv2.cvtColor(hsv.astype(np.uint8), cv2.COLOR_HSV2BGR)
-
-    def _add_gaussian_noise(self, img: np.ndarray, sigma: int) -> np.ndarray:
-        """Add Gaussian noise"""
-        noise = np.random.normal(0, sigma, img.shape).astype(np.float32)
-        noisy = np.clip(img.astype(np.float32) + noise, 0, 255)
-        return noisy.astype(np.uint8)
-
-    def _apply_blur(self, img: np.ndarray, radius: int) -> np.ndarray:
-        """Apply Gaussian blur"""
+        Brightness and saturation scale the V and S channels, so they share one
+        HSV round trip with a single 3-channel LUT. Contrast stretches the BGR
+        values around the image mean and is a second LUT on the result. The
+        alpha channel of BGRA images passes through unchanged.
+        """
+        brightness = saturation = contrast = None
+        if self.config.get('brightness'):
+            brightness = 1 + rng.uniform(*self.config.get('brightness_range', (-0.2, 0.2)))
+        if self.config.get('contrast'):
+            contrast = rng.uniform(*self.config.get('contrast_range', (0.8, 1.2)))
+        if self.config.get('saturation'):
+            saturation = rng.uniform(*self.config.get('saturation_range', (0.8, 1.2)))
+
+        if brightness is not None or saturation is not None:
+            lut = np.empty((256, 1, 3), dtype=np.uint8)
+            lut[:, 0, 0] = _IDENTITY_LUT
+            lut[:, 0, 1] = _scale_lut(saturation)
+            lut[:, 0, 2] = _scale_lut(brightness)
+            hsv = buffers.hsv
+            bgr = buffers.bgr if img.shape[2] == 4 else img
+            if bgr is not img:
+                cv2.cvtColor(img, cv2.COLOR_BGRA2BGR, dst=bgr)
+            cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV, dst=hsv)
+            cv2.LUT(hsv, lut, dst=hsv)
+            cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR, dst=bgr)
+            if bgr is not img:
+                img[..., :3] = bgr
+
+        if contrast is not None:
+            channels = min(img.shape[2], 3) if img.ndim == 3 else 1
+            mean = sum(cv2.mean(img)[:channels]) / channels
+            lut = np.clip((_IDENTITY_LUT - mean) * contrast + mean, 0, 255).astype(np.uint8)
+            if img.ndim == 3 and img.shape[2] == 4:
+                lut = np.stack([lut, lut, lut, _IDENTITY_LUT.astype(np.uint8)], axis=1).reshape(256, 1, 4)
+            cv2.LUT(img, lut, dst=img)
+
+    def _add_gaussian_noise(self, img: np.ndarray, sigma: int, rng: np.random.Generator,
+                            buffers: '_Buffers'):
+        """Add Gaussian noise in place"""
+        noisy = buffers.noise
+        rng.standard_normal(dtype=np.float32, out=noisy)
+        noisy *= sigma
+        noisy += img
+        np.clip(noisy, 0, 255, out=noisy)
+        np.copyto(img, noisy, casting='unsafe')
+
+    def _apply_blur(self, img: np.ndarray, radius: int):
+        """Apply Gaussian blur in place"""
         if radius > 0:
             ksize = radius * 2 + 1
-            return cv2.GaussianBlur(img, (ksize, ksize), 0)
-        return img
+            cv2.GaussianBlur(img, (ksize, ksize), 0, dst=img)
+
+
+class _Buffers:
+    """Scratch arrays shared by the samples of one batch, allocated on first use"""
+
+    def __init__(self, shape: Tuple[int, ...]):
+        self.shape = shape
+        self._hsv = None
+        self._bgr = None
+        self._noise = None
+
+    @property
+    def hsv(self) -> np.ndarray:
+        if self._hsv is None:
+            self._hsv = np.empty(self.shape[:2] + (3,), dtype=np.uint8)
+        return self._hsv
+
+    @property
+    def bgr(self) -> np.ndarray:
+        """Color channels of a BGRA sample"""
+        if self._bgr is None:
+            self._bgr = np.empty(self.shape[:2] + (3,), dtype=np.uint8)
+        return self._bgr
+
+    @property
+    def noise(self) -> np.ndarray:
+        if self._noise is None:
+            self._noise = np.empty(self.shape, dtype=np.float32)
+        return self._noise
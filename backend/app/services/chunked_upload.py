@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Chunked Uploads
+
+Resumable uploads for unreliable connections: the client creates an upload,
+sends the file in chunks at explicit offsets and finalizes it. Chunks are
+appended straight to <upload name>.part in the incoming folder while a
+SHA-256 is updated incrementally, so finalizing neither copies nor re-reads
+the file. After a dropped connection the client asks for the current offset
+and continues from there.
+
+The bytes on disk are the source of truth for the offset. The running hash
+is kept in memory and rebuilt from the partial file when it is missing, e.g.
+after a restart.
+"""
+import os
+import uuid
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from typing import BinaryIO, Optional
+from flask import Flask
+from app.extensions import db
+from app.models import ChunkedUpload, Project, UploadBatch
+from .ingest import ingest
+
+
+class UploadOffsetError(Exception):
+    """Raised when a chunk does not start where the received bytes end"""
+
+    def __init__(self, offset: int):
+        super().__init__(f'Upload continues at offset {offset}')
+        self.offset = offset
+
+
+class ChunkedUploadService:
+    """Creates, appends to and finalizes chunked uploads"""
+
+    READ_SIZE = 64 * 1024  # Bytes read from the request stream at a time
+
+    def __init__(self, app: Flask = None):
+        self.app = None
+        self._hashers = {}  # upload id -> (offset, running sha256)
+        self._locks = {}  # upload id -> lock serializing its chunks
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        self.app = app
+        app.extensions['chunked_uploads'] = self
+
+    @property
+    def chunk_size(self) -> int:
+        return self.app.config.get('UPLOAD_CHUNK_SIZE', 1024 * 1024)
+
+    def part_path(self, upload: ChunkedUpload) -> str:
+        return f'{self.final_path(upload)}.part'
+
+    def final_path(self, upload: ChunkedUpload) -> str:
+        return os.path.join(self.app.config['INCOMING_FOLDER'], str(upload.project_id), upload.filename)
+
+    def received_path(self, upload: ChunkedUpload) -> str:
+        """
+        File holding the received bytes
+
+        That is the partial file, or the final file when a finalize moved it
+        but was interrupted before its transaction committed.
+        """
+        part_path = self.part_path(upload)
+        final_path = self.final_path(upload)
+        if not os.path.exists(part_path) and os.path.exists(final_path):
+            return final_path
+        return part_path
+
+    def offset(self, upload: ChunkedUpload) -> int:
+        """Number of bytes received so far"""
+        if upload.status == 'completed':
+            return upload.total_size
+        try:
+            return os.path.getsize(self.received_path(upload))
+        except OSError:
+            return 0
+
+    def create(self, project: Project, original_filename: str, size: int,
+               uploader_name: Optional[str] = None) -> ChunkedUpload:
+        """
+        Start an upload of size bytes
+
+        Returns:
+            The new ChunkedUpload, with an empty partial file on disk
+        """
+        self.purge_stale()
+
+        ext = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else 'jpg'
+        upload = ChunkedUpload(
+            id=uuid.uuid4().hex,
+            project_id=project.id,
+            filename=f"{uuid.uuid4().hex}.{ext}",
+            original_filename=original_filename,
+            uploader_name=uploader_name,
+            total_size=size
+        )
+
+        part_path = self.part_path(upload)
+        os.makedirs(os.path.dirname(part_path), exist_ok=True)
+        open(part_path, 'wb').close()
+
+        db.session.add(upload)
+        db.session.commit()
+        return upload
+
+    def append(self, upload: ChunkedUpload, offset: int, stream: BinaryIO) -> int:
+        """
+        Append a chunk read from stream at offset
+
+        Bytes read before the stream fails (dropped connection) are kept, so
+        the client can resume after them.
+
+        Returns:
+            The new offset
+
+        Raises:
+            UploadOffsetError: offset is not the number of bytes received
+            ValueError: the upload is finished or the chunk exceeds the declared size
+        """
+        with self._upload_lock(upload.id):
+            # Checked under the lock: a concurrent finalize may just have completed it
+            db.session.refresh(upload)
+            if upload.status != 'uploading' or self.received_path(upload) != self.part_path(upload):
+                raise ValueError('Upload is already finalized')
+
+            current = self.offset(upload)
+            if offset != current:
+                raise UploadOffsetError(current)
+
+            hasher = self._hasher(upload, current)
+            try:
+                with open(self.part_path(upload), 'ab') as f:
+                    for block in iter(lambda: stream.read(self.READ_SIZE), b''):
+                        if current + len(block) > upload.total_size:
+                            raise ValueError('Chunk exceeds the declared file size')
+                        f.write(block)
+                        hasher.update(block)
+                        current += len(block)
+            finally:
+                with self._lock:
+                    self._hashers[upload.id] = (current, hasher)
+            return current
+
+    def finalize(self, upload: ChunkedUpload, expected_hash: Optional[str] = None) -> UploadBatch:
+        """
+        Move a complete upload into place and queue it for ingestion
+
+        Finalizing twice returns the same batch, so clients can retry. The
+        batch and the upload's completion are committed together, and a
+        finalize interrupted before that commit can simply be repeated.
+
+        Args:
+            upload: Upload whose bytes have all been received
+            expected_hash: SHA-256 hex digest computed by the client, if any
+
+        Raises:
+            UploadOffsetError: bytes are still missing
+            ValueError: the content does not match expected_hash; the upload
+                is reset to offset 0
+        """
+        with self._upload_lock(upload.id):
+            db.session.refresh(upload)
+            if upload.status == 'completed':
+                batch = UploadBatch.query.get(upload.batch_id) if upload.batch_id else None
+                if batch is not None:
+                    return batch
+                if not os.path.exists(self.final_path(upload)):
+                    raise ValueError('Upload is no longer available, upload the file again')
+                upload.status = 'uploading'  # Batch lost: submit the file again
+
+            current = self.offset(upload)
+            if current != upload.total_size:
+                raise UploadOffsetError(current)
+
+            digest = self._hasher(upload, current).hexdigest()
+            if expected_hash and expected_hash.lower() != digest:
+                open(self.part_path(upload), 'wb').close()
+                self._forget(upload.id)
+                raise ValueError('Checksum mismatch, upload the file again')
+
+            if self.received_path(upload) != self.final_path(upload):
+                os.replace(self.part_path(upload), self.final_path(upload))
+
+            batch = ingest.prepare(
+                Project.query.get(upload.project_id),
+                [{'filename': upload.filename, 'original_filename': upload.original_filename,
+                  'content_hash': digest}],
+                upload_source='mobile',
+                uploader_name=upload.uploader_name
+            )
+            upload.status = 'completed'
+            upload.batch_id = batch.id
+            db.session.commit()
+            ingest.start(batch)
+
+        self._forget(upload.id)
+        return batch
+
+    def purge_stale(self):
+        """Drop uploads older than UPLOAD_SESSION_TTL seconds and their partial files"""
+        ttl = self.app.config.get('UPLOAD_SESSION_TTL', 24 * 3600)
+        cutoff = datetime.utcnow() - timedelta(seconds=ttl)
+        stale = ChunkedUpload.query.filter(ChunkedUpload.created_at < cutoff).all()
+        for upload in stale:
+            if upload.status == 'uploading' and os.path.exists(self.part_path(upload)):
+                os.remove(self.part_path(upload))
+            self._forget(upload.id)
+            db.session.delete(upload)
+        if stale:
+            db.session.commit()
+
+    def _hasher(self, upload: ChunkedUpload, offset: int):
+        """Running hash of the first offset bytes, rebuilt from disk when unknown"""
+        with self._lock:
+            cached = self._hashers.get(upload.id)
+        if cached is not None and cached[0] == offset:
+            return cached[1]
+
+        hasher = hashlib.sha256()
+        remaining = offset
+        with open(self.received_path(upload), 'rb') as f:
+            while remaining > 0:
+                block = f.read(min(self.READ_SIZE * 16, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+        return hasher
+
+    def _upload_lock(self, upload_id: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _forget(self, upload_id: str):
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+            self._locks.pop(upload_id, None)
+
+
+chunked_uploads = ChunkedUploadService()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk Deletion
+
+Projects and sets of images are deleted with a handful of set-based DELETE
+statements in one short transaction, instead of loading every image and
+annotation through the ORM cascades. Their files are removed afterwards by
+the background reclaimer.
+"""
+import os
+from typing import Dict, Iterable, List, Optional
+from flask import current_app
+from app.extensions import db
+from app.models import (Annotation, ChunkedUpload, ExportJob, Image, LabelClass, Project,
+                        ProjectMember, UploadBatch)
+from .export_jobs import export_jobs
+from .thumbnails import thumbnails, THUMBNAIL_SIZES
+from .reclaim import reclaimer
+
+
+ID_CHUNK_SIZE = 500  # Ids per IN (...) list, below SQLite's bound parameter limit
+
+
+def _delete(model, *criteria):
+    """Set-based DELETE without loading or synchronizing ORM objects"""
+    statement = db.delete(model).where(*criteria).execution_options(synchronize_session=False)
+    return db.session.execute(statement).rowcount
+
+
+def delete_images(project_id: int, image_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Delete images of a project with their annotations
+
+    Args:
+        project_id: Project the images belong to; ids of other projects are ignored
+        image_ids: Images to delete, None for all images of the project
+
+    Returns:
+        Number of images deleted
+    """
+    if image_ids is None:
+        chunks = [None]
+    else:
+        image_ids = sorted({int(image_id) for image_id in image_ids})
+        chunks = [image_ids[i:i + ID_CHUNK_SIZE] for i in range(0, len(image_ids), ID_CHUNK_SIZE)]
+
+    keys = set()
+    deleted = 0
+    for chunk in chunks:
+        criteria = [Image.project_id == project_id]
+        if chunk is not None:
+            criteria.append(Image.id.in_(chunk))
+
+        keys.update(key for (key,) in db.session.query(Image.storage_key).filter(*criteria).distinct())
+        selected = db.select(Image.id).where(*criteria)
+        _delete(Annotation, Annotation.image_id.in_(selected))
+        deleted += _delete(Image, *criteria)
+
+    db.session.commit()
+    db.session.expire_all()
+
+    reclaimer.submit(keys=keys)
+    return deleted
+
+
+def delete_project(project: Project) -> Dict[str, int]:
+    """
+    Delete a project and everything that belongs to it
+
+    Running exports of the project are cancelled. The project's files
+    (images no other project shares, thumbnails, pending uploads and export
+    archives) are removed in the background.
+
+    Returns:
+        Counts of deleted 'images' and 'annotations'
+    """
+    project_id = project.id
+    for job in ExportJob.query.filter(ExportJob.project_id == project_id,
+                                      ExportJob.status.in_(('queued', 'running'))):
+        export_jobs.cancel(job)
+
+    keys = [key for (key,) in db.session.query(Image.storage_key).filter(
+        Image.project_id == project_id
+    ).distinct()]
+    exports = [path for (path,) in db.session.query(ExportJob.file_path).filter(
+        ExportJob.project_id == project_id,
+        ExportJob.file_path.isnot(None)
+    )]
+
+    images = db.select(Image.id).where(Image.project_id == project_id)
+    counts = {'annotations': _delete(Annotation, Annotation.image_id.in_(images))}
+    counts['images'] = _delete(Image, Image.project_id == project_id)
+    for model in (LabelClass, ProjectMember, UploadBatch, ChunkedUpload, ExportJob):
+        _delete(model, model.project_id == project_id)
+    _delete(Project, Project.id == project_id)
+    db.session.commit()
+    db.session.expire_all()
+
+    reclaimer.submit(keys=keys, paths=exports + _project_folders(project_id))
+    return counts
+
+
+def _project_folders(project_id: int) -> List[str]:
+    """Per-project folders: unmigrated files, their thumbnails and pending uploads"""
+    config = current_app.config
+    upload_folder = os.path.join(config['UPLOAD_FOLDER'], str(project_id))
+    folders = [upload_folder, os.path.join(config['INCOMING_FOLDER'], str(project_id))]
+    relative = os.path.relpath(upload_folder, config['DATA_DIR'])
+    folders += [os.path.join(thumbnails.folder, str(size), relative) for size in THUMBNAIL_SIZES]
+    return folders
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Background Export Jobs
+
+Exports run on worker threads instead of inside the HTTP request. Jobs are
+persisted in the export_jobs table, so progress can be polled, a running
+export can be cancelled, and jobs interrupted by a restart are picked up
+again by resume_pending().
+"""
+import os
+import time
+import uuid
+import queue
+import threading
+from datetime import datetime
+from flask import Flask
+from app.extensions import db
+from app.models import Project, ExportJob
+from .exporter import DatasetExporter
+from .project_exporter import ProjectExporter
+
+
+class ExportCancelled(Exception):
+    """Raised inside a running export when its job has been cancelled"""
+
+
+class _JobProgress:
+    """Progress callback for one running job"""
+
+    INTERVAL = 1.0  # Seconds between progress commits
+
+    def __init__(self, queue_: 'ExportJobQueue', job: ExportJob):
+        self.queue = queue_
+        self.job = job
+        self._last_commit = 0.0
+
+    def update(self, images_done: int, images_total: int, bytes_written: int):
+        if self.queue.is_cancelled(self.job.id):
+            raise ExportCancelled()
+
+        now = time.monotonic()
+        if now - self._last_commit < self.INTERVAL:
+            return
+        self._last_commit = now
+
+        self.job.images_done = images_done
+        self.job.images_total = images_total
+        self.job.bytes_written = bytes_written
+        db.session.commit()
+
+        # Reloaded after the commit, so cancellations from other processes are seen too
+        if self.job.cancel_requested:
+            raise ExportCancelled()
+
+
+class ExportJobQueue:
+    """Queue of export jobs executed by background worker threads"""
+
+    def __init__(self, app: Flask = None):
+        self.app = None
+        self._queue = queue.Queue()
+        self._workers = []
+        self._cancelled = set()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        self.app = app
+        app.extensions['export_jobs'] = self
+
+    def submit(self, project: Project, exporter: str, options: dict) -> ExportJob:
+        """
+        Create a queued job and hand it to a worker
+
+        Args:
+            project: Project to export
+            exporter: 'archive' (ProjectExporter) or 'dataset' (DatasetExporter)
+            options: Export request body
+
+        Returns:
+            The new ExportJob
+        """
+        format_type = options.get('format', 'yolo')
+        job = ExportJob(
+            id=uuid.uuid4().hex,
+            project_id=project.id,
+            exporter=exporter,
+            format=format_type,
+            status='queued',
+            images_total=project.images.count(),
+            download_name=f'{project.name}_{format_type}.zip'
+        )
+        job.set_options(options)
+        db.session.add(job)
+        db.session.commit()
+
+        self._enqueue(job.id)
+        return job
+
+    def cancel(self, job: ExportJob) -> ExportJob:
+        """Request cancellation; queued jobs are cancelled immediately"""
+        if job.is_finished:
+            return job
+
+        job.cancel_requested = True
+        if job.status == 'queued':
+            job.status = 'cancelled'
+            job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+        with self._lock:
+            self._cancelled.add(job.id)
+        return job
+
+    def is_cancelled(self, job_id: str) -> bool:
+        with self._lock:
+            return job_id in self._cancelled
+
+    def resume_pending(self):
+        """Requeue jobs left queued or running by a previous run (needs app context)"""
+        jobs = ExportJob.query.filter(
+            ExportJob.status.in_(('queued', 'running'))
+        ).order_by(ExportJob.created_at).all()
+
+        resumed = []
+        for job in jobs:
+            if job.cancel_requested:
+                job.status = 'cancelled'
+                job.finished_at = datetime.utcnow()
+                continue
+            # Partial output cannot be trusted, start over
+            job.status = 'queued'
+            job.images_done = 0
+            job.bytes_written = 0
+            resumed.append(job.id)
+        db.session.commit()
+
+        for job_id in resumed:
+            self._enqueue(job_id)
+        return len(resumed)
+
+    def _enqueue(self, job_id: str):
+        self._ensure_workers()
+        self._queue.put(job_id)
+
+    def _ensure_workers(self):
+        with self._lock:
+            self._workers = [t for t in self._workers if t.is_alive()]
+            while len(self._workers) < self.app.config.get('EXPORT_JOB_WORKERS', 1):
+                worker = threading.Thread(target=self._work, name='export-job-worker', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                with self.app.app_context():
+                    self._run(job_id)
+            except Exception as e:
+                print(f"Export job {job_id} crashed: {e}")
+            finally:
+                with self._lock:
+                    self._cancelled.discard(job_id)
+                self._queue.task_done()
+
+    def _run(self, job_id: str):
+        job = ExportJob.query.get(job_id)
+        if job is None or job.status != 'queued':
+            return
+
+        project = Project.query.get(job.project_id)
+        if project is None:
+            job.status = 'failed'
+            job.error = f'Project {job.project_id} not found'
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            return
+
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+
+        progress = _JobProgress(self, job)
+        export_folder = self.app.config['EXPORT_FOLDER']
+
+        zip_path = error = None
+        try:
+            if job.exporter == 'archive':
+                zip_path = self._run_archive(job, project, export_folder, progress)
+            else:
+                zip_path = self._run_dataset(job, project, export_folder, progress)
+            status = 'completed'
+        except ExportCancelled:
+            status = 'cancelled'
+        except Exception as e:
+            status, error = 'failed', str(e)
+        if status != 'completed':
+            db.session.rollback()
+
+        if not self._job_exists(job_id):
+            # Deleting the project deleted the job row while it ran: drop the output
+            db.session.rollback()
+            if zip_path is not None and os.path.exists(zip_path):
+                os.remove(zip_path)
+            return
+
+        job.status = status
+        if error is not None:
+            job.error = error
+        if zip_path is not None:
+            job.file_path = zip_path
+            job.file_size = os.path.getsize(zip_path)
+            job.bytes_written = job.file_size
+            job.images_done = job.images_total
+
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+    @staticmethod
+    def _job_exists(job_id: str) -> bool:
+        """Whether the job row is still there, without flushing pending changes to it"""
+        with db.session.no_autoflush:
+            return db.session.query(ExportJob.id).filter(ExportJob.id == job_id).scalar() is not None
+
+    def _run_archive(self, job: ExportJob, project: Project, export_folder: str,
+                     progress: _JobProgress) -> str:
+        """Write the streamed ProjectExporter archive to disk"""
+        exporter = ProjectExporter(project, job.get_options())
+        job.images_total = len(exporter.images)
+
+        zip_path = os.path.join(export_folder, f'{job.id}.zip')
+        part_path = f'{zip_path}.part'
+        written = 0
+        try:
+            with open(part_path, 'wb') as f:
+                for chunk in exporter.iter_zip():
+                    f.write(chunk)
+                    written += len(chunk)
+                    progress.update(exporter.images_done, len(exporter.images), written)
+            os.replace(part_path, zip_path)
+        except BaseException:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        return zip_path
+
+    def _run_dataset(self, job: ExportJob, project: Project, export_folder: str,
+                     progress: _JobProgress) -> str:
+        """Run DatasetExporter with the job id as output name"""
+        options = job.get_options()
+        exporter = DatasetExporter(project, export_folder, export_id=job.id, progress=progress.update)
+        return exporter.export(
+            format_type=job.format,
+            include_augmentation=options.get('augmentation', False),
+            augmentation_config=options.get('augmentation_config', {})
+        )
+
+
+export_jobs = ExportJobQueue()
@@ -2,22 +2,109 @@
 """
 Dataset Exporter Service
 """
+from flask import current_app
 from app.models import Project, Image, Annotation
-from .augmentation import Augmentor
+from .augmentation import Augmentor, sample_rng
+from .augment_pool import AugmentationPool
+from .augment_cache import augment_cache
+from .export_data import load_export_data
+from .pipeline import stage
+from app.utils.file import file_hash
+from app.utils.zipstream import compress_type_for
 import os
+import cv2
 import json
-import shutil
+import uuid
 import zipfile
 from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+
+# Images per augmentation task when samples combine several images
+# (mosaic, mixup); partners are drawn from the same group
+PARTNER_GROUP_SIZE = 4
+
+
+def augment_group_task(items: List[Tuple[str, List[Dict], int]], config: dict,
+                       multiplier: int) -> List[Tuple[Optional[list], Optional[str]]]:
+    """
+    Produce augmented copies of a group of images (runs in a worker process)
+
+    Every image is decoded once; multi-image augmentations take their
+    partners from the other images of the group. Copy idx of an image draws
+    from sample_rng(config['seed'], image_id, idx), so seeded exports are
+    reproducible regardless of which worker runs the task.
+
+    Args:
+        items: (file_path, boxes, image_id) per image
+
+    Returns:
+        Per image ([(jpeg_bytes, boxes), ...], None), or (None, error message)
+    """
+    decoded = []
+    for file_path, boxes, _ in items:
+        img = cv2.imread(file_path)
+        decoded.append((img, boxes) if img is not None else None)
+
+    augmentor = Augmentor(config)
+    seed = config.get('seed')
+    results = []
+
+    for i, (file_path, boxes, image_id) in enumerate(items):
+        if decoded[i] is None:
+            results.append((None, f"Failed to load image: {file_path}"))
+            continue
+
+        img = decoded[i][0]
+        rngs = [sample_rng(seed, image_id, idx) for idx in range(multiplier)]
+        try:
+            if augmentor.needs_partners:
+                partners = [d for j, d in enumerate(decoded) if j != i and d is not None]
+                sources = [augmentor.combine(img, boxes, partners, rng) for rng in rngs]
+                aug_imgs, aug_boxes = augmentor.augment_batch(
+                    [src for src, _ in sources], [annos for _, annos in sources], rngs)
+            else:
+                aug_imgs, aug_boxes = augmentor.augment_batch(img, boxes, rngs)
+        except Exception as e:
+            results.append((None, str(e)))
+            continue
+
+        samples = []
+        for aug_img, sample_boxes in zip(aug_imgs, aug_boxes):
+            _, buffer = cv2.imencode('.jpg', aug_img, [cv2.IMWRITE_JPEG_QUALITY, 95])
+            samples.append((buffer.tobytes(), sample_boxes))
+        results.append((samples, None))
+
+    return results
 
 
 class DatasetExporter:
     """Export dataset in various formats"""
 
-    def __init__(self, project: Project, export_folder: str):
+    def __init__(self, project: Project, export_folder: str, export_id: Optional[str] = None,
+                 progress: Optional[Callable[[int, int, int], None]] = None):
+        """
+        Initialize exporter
+
+        Args:
+            project: Project to export
+            export_folder: Directory receiving the zip file
+            export_id: Output file name without extension (unique per run by default)
+            progress: Called as progress(images_done, images_total, bytes_written)
+                after each image; raising from it aborts the export
+        """
         self.project = project
         self.export_folder = export_folder
         self.timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.export_id = export_id or f"{project.id}_{self.timestamp}_{uuid.uuid4().hex[:8]}"
+        self.progress = progress
+        self.images_done = 0
+        self.bytes_written = 0
+        self._zipf = None
+
+        # Augmentation runs in worker processes while the archive is written
+        self.pool = AugmentationPool.from_config(current_app.config)
+        self.pipeline_depth = current_app.config.get('EXPORT_PIPELINE_DEPTH', 8)
 
     def export(self, format_type: str, include_augmentation: bool = False,
                augmentation_config: dict = None) -> str:
@@ -27,104 +114,252 @@ class DatasetExporter:
         Args:
             format_type: yolo, coco, voc, createml, csv
             include_augmentation: Whether to apply augmentation
-            augmentation_config: Augmentation settings
+            augmentation_config: Augmentor settings, plus
+                - multiplier: augmented copies per image (default 1)
+                - splits: splits to augment (default ['train'])
+                - seed: makes the augmented copies reproducible (and cacheable)
+                - mosaic / mixup: combine images, see Augmentor.combine()
 
         Returns:
             Path to zip file
         """
-        # Create export directory
-        export_dir = os.path.join(
-            self.export_folder,
-            f"{self.project.id}_{self.timestamp}"
-        )
-        os.makedirs(export_dir, exist_ok=True)
-
-        # Export based on format
-        if format_type == 'yolo':
-            self._export_yolo(export_dir, include_augmentation, augmentation_config)
-        elif format_type == 'coco':
-            self._export_coco(export_dir, include_augmentation, augmentation_config)
-        elif format_type == 'voc':
-            self._export_voc(export_dir, include_augmentation, augmentation_config)
-        elif format_type == 'createml':
-            self._export_createml(export_dir, include_augmentation, augmentation_config)
-        elif format_type == 'csv':
-            self._export_csv(export_dir)
-        else:
-            raise ValueError(f"Unsupported format: {format_type}")
-
-        # Create zip file
-        zip_path = f"{export_dir}.zip"
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(export_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, export_dir)
-                    zipf.write(file_path, arcname)
-
-        # Cleanup directory
-        shutil.rmtree(export_dir)
+        self.include_augmentation = include_augmentation
+        self.augmentation_config = augmentation_config or {}
+
+        # Load images, classes and annotations in bulk
+        self.data = load_export_data(self.project)
+
+        # Entries are written straight into the archive, no staging directory
+        zip_path = os.path.join(self.export_folder, f"{self.export_id}.zip")
+
+        try:
+            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+                self._zipf = zipf
+
+                # Export based on format
+                if format_type == 'yolo':
+                    self._export_yolo()
+                elif format_type == 'coco':
+                    self._export_coco()
+                elif format_type == 'voc':
+                    self._export_voc()
+                elif format_type == 'createml':
+                    self._export_createml()
+                elif format_type == 'csv':
+                    self._export_csv()
+                else:
+                    raise ValueError(f"Unsupported format: {format_type}")
+            self.bytes_written = os.path.getsize(zip_path)
+        except BaseException:
+            # Failed or cancelled: do not leave a partial archive behind
+            if os.path.exists(zip_path):
+                os.remove(zip_path)
+            raise
+        finally:
+            self._zipf = None
 
         return zip_path
 
-    def _export_yolo(self, export_dir: str, include_augmentation: bool,
-                     augmentation_config: dict):
-        """Export in YOLO format"""
-        # Create directory structure
-        for split in ['train', 'val', 'test']:
-            os.makedirs(os.path.join(export_dir, split, 'images'), exist_ok=True)
-            os.makedirs(os.path.join(export_dir, split, 'labels'), exist_ok=True)
+    def _write_image(self, arcname: str, data: bytes):
+        """Add an image to the archive (stored, not re-compressed)"""
+        self._zipf.writestr(arcname, data, compress_type=compress_type_for(arcname))
+        self.bytes_written = self._zipf.fp.tell()
+
+    def _write_text(self, arcname: str, content: str):
+        """Add a text entry to the archive (deflated)"""
+        self._zipf.writestr(arcname, content)
+        self.bytes_written = self._zipf.fp.tell()
+
+    def _image_done(self):
+        """Count a finished image and report progress"""
+        self.images_done += 1
+        if self.progress:
+            self.progress(self.images_done, len(self.data.images), self.bytes_written)
+
+    def _boxes(self, image: Image) -> List[Dict]:
+        """Bounding boxes of an image in Augmentor format"""
+        boxes = []
+        for anno in self.data.annotations_for(image):
+            if anno.annotation_type == 'bbox':
+                data = anno.get_data()
+                boxes.append({
+                    'bbox': [data['x'], data['y'], data['width'], data['height']],
+                    'class_id': anno.class_id
+                })
+        return boxes
+
+    def _cache_keys(self, images: List[Image], boxes: List[List[Dict]],
+                    multiplier: int) -> Optional[List[List[str]]]:
+        """
+        Augmentation cache keys of the copies of a task's images
 
+        With multi-image augmentations a copy also depends on the content and
+        boxes of the other images in its group, so those are part of its key.
+
+        Returns:
+            Keys per image, or None when the group is not cacheable
+        """
+        config = self.augmentation_config
+        seed = config.get('seed')
+        if seed is None or not augment_cache.enabled:
+            return None
+        if not all(os.path.exists(image.file_path) for image in images):
+            return None
+
+        hashes = [image.content_hash or file_hash(image.file_path) for image in images]
+        with_partners = Augmentor(config).needs_partners
+
+        keys = []
+        for i, image in enumerate(images):
+            labels = boxes[i]
+            if with_partners:
+                partners = [[hashes[j], boxes[j]] for j in range(len(images)) if j != i]
+                labels = [boxes[i], partners]
+            keys.append([augment_cache.make_key('dataset', hashes[i], config, seed, image.id, idx,
+                                                labels=labels)
+                         for idx in range(multiplier)])
+        return keys
+
+    def _augmentation_tasks(self) -> Iterator[Tuple[list, Optional[tuple]]]:
+        """
+        Pair groups of images with their augmentation task args
+
+        Images that are not augmented pass through on their own. Augmented
+        images form groups of PARTNER_GROUP_SIZE when samples combine several
+        images, single-image groups otherwise. Groups whose copies are all in
+        the augmentation cache need no task.
+
+        Yields:
+            ([(image, cache keys, cached samples), ...], task args or None)
+        """
+        config = self.augmentation_config
+        splits = config.get('splits', ['train'])
+        multiplier = config.get('multiplier', 1)
+        group_size = PARTNER_GROUP_SIZE if Augmentor(config).needs_partners else 1
+
+        group = []
+        for image in self.data.images:
+            if not (self.include_augmentation and multiplier > 0 and (image.split or 'train') in splits):
+                yield [(image, None, None)], None
+                continue
+
+            group.append(image)
+            if len(group) == group_size:
+                yield self._group_task(group, multiplier)
+                group = []
+
+        if group:
+            yield self._group_task(group, multiplier)
+
+    def _group_task(self, images: List[Image], multiplier: int) -> Tuple[list, Optional[tuple]]:
+        """Task entry of one group, served from the cache when possible"""
+        boxes = [self._boxes(image) for image in images]
+        keys = self._cache_keys(images, boxes, multiplier) or [None] * len(images)
+
+        if keys[0] is not None:
+            cached = [[augment_cache.get(key) for key in image_keys] for image_keys in keys]
+            if all(all(samples) for samples in cached):
+                return list(zip(images, keys, cached)), None
+
+        items = [(image.file_path, image_boxes, image.id) for image, image_boxes in zip(images, boxes)]
+        entries = [(image, image_keys, None) for image, image_keys in zip(images, keys)]
+        return entries, (items, self.augmentation_config, multiplier)
+
+    def _read_sources(self) -> Iterator[Tuple[list, Optional[tuple]]]:
+        """
+        Reader stage: augmentation tasks with the original file bytes added
+
+        Yields:
+            ([(image, original bytes, cache keys, cached samples), ...], task args or None)
+        """
+        for entries, args in self._augmentation_tasks():
+            read = []
+            for image, keys, cached in entries:
+                with open(image.file_path, 'rb') as f:
+                    read.append((image, f.read(), keys, cached))
+            yield read, args
+
+    def _iter_samples(self) -> Iterator[Tuple[Image, str, bytes, List[Dict]]]:
+        """
+        Yield every sample to export: each original image followed by its
+        augmented copies
+
+        Source files are read, augmented and encoded on pipeline stages ahead
+        of the caller, which only writes the archive.
+
+        Yields:
+            (image, filename, image bytes, boxes)
+        """
+        depth = self.pipeline_depth
+        sources = stage(self._read_sources(), depth, 'export-reader')
+        augmented = stage(self.pool.imap(augment_group_task, sources), depth, 'export-augment')
+
+        for entries, results, error in augmented:
+            for k, (image, original, keys, cached) in enumerate(entries):
+                yield image, image.filename, original, self._boxes(image)
+
+                samples = None
+                if error is not None:
+                    print(f"Augmentation failed for {image.filename}: {error}")
+                elif cached is not None:
+                    samples = cached
+                elif results is not None:
+                    samples, image_error = results[k]
+                    if image_error is not None:
+                        print(f"Augmentation failed for {image.filename}: {image_error}")
+                    elif keys:
+                        for key, (jpeg_bytes, boxes) in zip(keys, samples):
+                            augment_cache.put(key, jpeg_bytes, boxes)
+
+                base_name = os.path.splitext(image.filename)[0]
+                for idx, (jpeg_bytes, boxes) in enumerate(samples or []):
+                    yield image, f"{base_name}_aug{idx}.jpg", jpeg_bytes, boxes
+
+                self._image_done()
+
+    def _export_yolo(self):
+        """Export in YOLO format"""
         # Get class mapping
-        classes = list(self.project.label_classes.order_by('id').all())
+        classes = self.data.classes
         class_map = {c.id: idx for idx, c in enumerate(classes)}
 
         # Write classes file
-        with open(os.path.join(export_dir, 'classes.txt'), 'w', encoding='utf-8') as f:
-            for c in classes:
-                f.write(f"{c.name}\n")
+        self._write_text('classes.txt', ''.join(f"{c.name}\n" for c in classes))
 
         # Write data.yaml
-        with open(os.path.join(export_dir, 'data.yaml'), 'w', encoding='utf-8') as f:
-            f.write(f"train: ./train/images\n")
-            f.write(f"val: ./val/images\n")
-            f.write(f"test: ./test/images\n")
-            f.write(f"nc: {len(classes)}\n")
-            f.write(f"names: {[c.name for c in classes]}\n")
+        self._write_text('data.yaml', (
+            f"train: ./train/images\n"
+            f"val: ./val/images\n"
+            f"test: ./test/images\n"
+            f"nc: {len(classes)}\n"
+            f"names: {[c.name for c in classes]}\n"
+        ))
 
         # Export images and annotations
-        for image in self.project.images.all():
+        for image, filename, data, boxes in self._iter_samples():
             split_dir = image.split if image.split else 'train'
 
-            # Copy image
-            src_path = image.file_path
-            dst_path = os.path.join(export_dir, split_dir, 'images', image.filename)
-            shutil.copy(src_path, dst_path)
+            # Add image
+            self._write_image(f"{split_dir}/images/{filename}", data)
 
             # Write YOLO format labels
-            label_filename = os.path.splitext(image.filename)[0] + '.txt'
-            label_path = os.path.join(export_dir, split_dir, 'labels', label_filename)
-
-            with open(label_path, 'w') as f:
-                for anno in image.annotations.all():
-                    if anno.annotation_type == 'bbox':
-                        data = anno.get_data()
-                        class_idx = class_map.get(anno.class_id, 0)
-
-                        # Convert to YOLO format (normalized xywh)
-                        x_center = (data['x'] + data['width'] / 2) / image.width
-                        y_center = (data['y'] + data['height'] / 2) / image.height
-                        w = data['width'] / image.width
-                        h = data['height'] / image.height
-
-                        f.write(f"{class_idx} {x_center:.6f} {y_center:.6f} {w:.6f} {h:.6f}\n")
-
-    def _export_coco(self, export_dir: str, include_augmentation: bool,
-                     augmentation_config: dict):
+            label_filename = os.path.splitext(filename)[0] + '.txt'
+            lines = []
+            for box in boxes:
+                x, y, bw, bh = box['bbox']
+                class_idx = class_map.get(box['class_id'], 0)
+
+                # Convert to YOLO format (normalized xywh)
+                x_center = (x + bw / 2) / image.width
+                y_center = (y + bh / 2) / image.height
+                w = bw / image.width
+                h = bh / image.height
+
+                lines.append(f"{class_idx} {x_center:.6f} {y_center:.6f} {w:.6f} {h:.6f}\n")
+            self._write_text(f"{split_dir}/labels/{label_filename}", ''.join(lines))
+
+    def _export_coco(self):
         """Export in COCO format"""
-        # Create directory structure
-        os.makedirs(os.path.join(export_dir, 'images'), exist_ok=True)
-
         # Build COCO structure
         coco_data = {
             'info': {
@@ -139,7 +374,7 @@ class DatasetExporter:
         }
 
         # Add categories
-        classes = list(self.project.label_classes.order_by('id').all())
+        classes = self.data.classes
         for idx, c in enumerate(classes):
             coco_data['categories'].append({
                 'id': idx + 1,
@@ -151,127 +386,112 @@ class DatasetExporter:
 
         # Add images and annotations
         anno_id = 1
-        for img_idx, image in enumerate(self.project.images.all()):
-            # Copy image
-            shutil.copy(image.file_path, os.path.join(export_dir, 'images', image.filename))
+        for img_idx, (image, filename, data, boxes) in enumerate(self._iter_samples()):
+            # Add image
+            self._write_image(f"images/{filename}", data)
 
             # Add image entry
             coco_data['images'].append({
                 'id': img_idx + 1,
-                'file_name': image.filename,
+                'file_name': filename,
                 'width': image.width,
                 'height': image.height
             })
 
             # Add annotations
-            for anno in image.annotations.all():
-                if anno.annotation_type == 'bbox':
-                    data = anno.get_data()
-                    coco_data['annotations'].append({
-                        'id': anno_id,
-                        'image_id': img_idx + 1,
-                        'category_id': class_map.get(anno.class_id, 1),
-                        'bbox': [data['x'], data['y'], data['width'], data['height']],
-                        'area': data['width'] * data['height'],
-                        'iscrowd': 0
-                    })
-                    anno_id += 1
+            for box in boxes:
+                x, y, w, h = box['bbox']
+                coco_data['annotations'].append({
+                    'id': anno_id,
+                    'image_id': img_idx + 1,
+                    'category_id': class_map.get(box['class_id'], 1),
+                    'bbox': [x, y, w, h],
+                    'area': w * h,
+                    'iscrowd': 0
+                })
+                anno_id += 1
 
         # Write JSON
-        with open(os.path.join(export_dir, 'annotations.json'), 'w', encoding='utf-8') as f:
-            json.dump(coco_data, f, ensure_ascii=False, indent=2)
+        self._write_text('annotations.json', json.dumps(coco_data, ensure_ascii=False, indent=2))
 
-    def _export_voc(self, export_dir: str, include_augmentation: bool,
-                    augmentation_config: dict):
+    def _export_voc(self):
         """Export in Pascal VOC format"""
-        os.makedirs(os.path.join(export_dir, 'JPEGImages'), exist_ok=True)
-        os.makedirs(os.path.join(export_dir, 'Annotations'), exist_ok=True)
-
-        for image in self.project.images.all():
-            # Copy image
-            shutil.copy(image.file_path, os.path.join(export_dir, 'JPEGImages', image.filename))
+        for image, filename, data, boxes in self._iter_samples():
+            # Add image
+            self._write_image(f"JPEGImages/{filename}", data)
 
             # Create XML annotation
-            xml_content = self._create_voc_xml(image)
-            xml_filename = os.path.splitext(image.filename)[0] + '.xml'
-            with open(os.path.join(export_dir, 'Annotations', xml_filename), 'w', encoding='utf-8') as f:
-                f.write(xml_content)
+            xml_content = self._create_voc_xml(image, filename, boxes)
+            xml_filename = os.path.splitext(filename)[0] + '.xml'
+            self._write_text(f"Annotations/{xml_filename}", xml_content)
 
-    def _create_voc_xml(self, image: Image) -> str:
+    def _create_voc_xml(self, image: Image, filename: str, boxes: List[Dict]) -> str:
         """Create Pascal VOC XML for an image"""
         xml = f'''<?xml version="1.0" encoding="UTF-8"?>
 <annotation>
     <folder>JPEGImages</folder>
-    <filename>{image.filename}</filename>
+    <filename>{filename}</filename>
     <size>
         <width>{image.width}</width>
         <height>{image.height}</height>
         <depth>3</depth>
     </size>
 '''
-        for anno in image.annotations.all():
-            if anno.annotation_type == 'bbox':
-                data = anno.get_data()
-                xml += f'''    <object>
-        <name>{anno.label_class.name}</name>
+        for box in boxes:
+            x, y, w, h = box['bbox']
+            xml += f'''    <object>
+        <name>{self.data.class_name(box['class_id'])}</name>
         <bndbox>
-            <xmin>{int(data['x'])}</xmin>
-            <ymin>{int(data['y'])}</ymin>
-            <xmax>{int(data['x'] + data['width'])}</xmax>
-            <ymax>{int(data['y'] + data['height'])}</ymax>
+            <xmin>{int(x)}</xmin>
+            <ymin>{int(y)}</ymin>
+            <xmax>{int(x + w)}</xmax>
+            <ymax>{int(y + h)}</ymax>
         </bndbox>
     </object>
 '''
         xml += '</annotation>'
         return xml
 
-    def _export_createml(self, export_dir: str, include_augmentation: bool,
-                         augmentation_config: dict):
+    def _export_createml(self):
         """Export in Apple CreateML format"""
-        os.makedirs(os.path.join(export_dir, 'images'), exist_ok=True)
-
         annotations = []
 
-        for image in self.project.images.all():
-            # Copy image
-            shutil.copy(image.file_path, os.path.join(export_dir, 'images', image.filename))
+        for image, filename, data, boxes in self._iter_samples():
+            # Add image
+            self._write_image(f"images/{filename}", data)
 
             # Build annotation entry
             image_annos = []
-            for anno in image.annotations.all():
-                if anno.annotation_type == 'bbox':
-                    data = anno.get_data()
-                    image_annos.append({
-                        'label': anno.label_class.name,
-                        'coordinates': {
-                            'x': data['x'] + data['width'] / 2,
-                            'y': data['y'] + data['height'] / 2,
-                            'width': data['width'],
-                            'height': data['height']
-                        }
-                    })
+            for box in boxes:
+                x, y, w, h = box['bbox']
+                image_annos.append({
+                    'label': self.data.class_name(box['class_id']),
+                    'coordinates': {
+                        'x': x + w / 2,
+                        'y': y + h / 2,
+                        'width': w,
+                        'height': h
+                    }
+                })
 
             annotations.append({
-                'image': image.filename,
+                'image': filename,
                 'annotations': image_annos
             })
 
         # Write JSON
-        with open(os.path.join(export_dir, 'annotations.json'), 'w', encoding='utf-8') as f:
-            json.dump(annotations, f, ensure_ascii=False, indent=2)
+        self._write_text('annotations.json', json.dumps(annotations, ensure_ascii=False, indent=2))
 
-    def _export_csv(self, export_dir: str):
+    def _export_csv(self):
         """Export in CSV format"""
-        os.makedirs(os.path.join(export_dir, 'images'), exist_ok=True)
+        lines = ['filename,class,x,y,width,height\n']
 
-        with open(os.path.join(export_dir, 'annotations.csv'), 'w', encoding='utf-8') as f:
-            f.write('filename,class,x,y,width,height\n')
+        for image, filename, data, boxes in self._iter_samples():
+            self._write_image(f"images/{filename}", data)
 
-            for image in self.project.images.all():
-                shutil.copy(image.file_path, os.path.join(export_dir, 'images', image.filename))
+            for box in boxes:
+                x, y, w, h = box['bbox']
+                lines.append(f"{filename},{self.data.class_name(box['class_id'])},"
+                             f"{x},{y},{w},{h}\n")
 
-                for anno in image.annotations.all():
-                    if anno.annotation_type == 'bbox':
-                        data = anno.get_data()
-                        f.write(f"{image.filename},{anno.label_class.name},"
-                                f"{data['x']},{data['y']},{data['width']},{data['height']}\n")
+        self._write_text('annotations.csv', ''.join(lines))
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""
+Upload Ingestion
+
+Upload requests only stream the files to the incoming folder and record
+them in an UploadBatch; the response goes out as soon as the bytes are
+stored. A background thread then probes the files on a thread pool
+(dimensions, EXIF orientation, decodability, content hash), moves them into
+blob storage and inserts the Image rows in chunks, one short transaction per
+chunk. Batches interrupted by a restart
+are picked up again by resume_pending().
+
+Files identical to an image already in the project are not stored twice:
+depending on the project's duplicate_policy they are rejected or linked: the
+new image row shares the existing image's blob. The existing image is found
+by an indexed (project_id, content_hash) lookup.
+"""
+import os
+import uuid
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from flask import Flask
+from PIL import Image as PILImage
+from app.extensions import db
+from app.models import Image, Project, UploadBatch
+from app.storage import blobs
+from app.utils.file import file_hash
+from .thumbnails import thumbnails
+
+
+# EXIF orientations that rotate the image by 90 degrees
+_ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def probe_image(file_path: str, content_hash: Optional[str] = None) -> Dict:
+    """
+    Inspect an uploaded image
+
+    The image is fully decoded (JPEGs at 1/8 scale via draft mode) so that
+    truncated or corrupt files are rejected at upload time.
+
+    Args:
+        file_path: Uploaded file
+        content_hash: SHA-256 already computed while receiving the file
+
+    Returns:
+        width / height as displayed (EXIF orientation applied), file_size
+        and content_hash (SHA-256 hex)
+
+    Raises:
+        OSError / ValueError if the file is not a readable image
+    """
+    with PILImage.open(file_path) as img:
+        width, height = img.size
+        if img.getexif().get(0x0112) in _ROTATED_ORIENTATIONS:
+            width, height = height, width
+
+        img.draft(img.mode, (max(1, img.size[0] // 8), max(1, img.size[1] // 8)))
+        img.load()
+
+    return {
+        'width': width,
+        'height': height,
+        'file_size': os.path.getsize(file_path),
+        'content_hash': content_hash or file_hash(file_path)
+    }
+
+
+def _probe_quietly(file_path: str, content_hash: Optional[str] = None):
+    """(probe result, error message) - runs on the probe pool"""
+    try:
+        return probe_image(file_path, content_hash), None
+    except Exception as e:
+        return None, str(e) or e.__class__.__name__
+
+
+class IngestQueue:
+    """Queue of upload batches processed by a background thread"""
+
+    def __init__(self, app: Flask = None):
+        self.app = None
+        self._queue = queue.Queue()
+        self._worker = None
+        self._pool = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        self.app = app
+        app.extensions['ingest'] = self
+
+    def submit(self, project: Project, files: List[Dict], upload_source: str = 'web',
+               uploader_name: Optional[str] = None) -> UploadBatch:
+        """
+        Record files already saved to the incoming folder and queue them for probing
+
+        Args:
+            project: Project the images belong to
+            files: [{'filename': saved name, 'original_filename': client name}],
+                optionally with a known 'content_hash'
+            upload_source: 'web' or 'mobile'
+            uploader_name: Nickname of a mobile uploader
+
+        Returns:
+            The new UploadBatch
+        """
+        batch = self.prepare(project, files, upload_source, uploader_name)
+        db.session.commit()
+
+        self.start(batch)
+        return batch
+
+    @staticmethod
+    def prepare(project: Project, files: List[Dict], upload_source: str = 'web',
+                uploader_name: Optional[str] = None) -> UploadBatch:
+        """
+        Add a batch to the session without committing it
+
+        For callers that record the batch together with their own changes;
+        they commit and then pass the batch to start().
+        """
+        batch = UploadBatch(
+            id=uuid.uuid4().hex,
+            project_id=project.id,
+            upload_source=upload_source,
+            uploader_name=uploader_name,
+            status='queued',
+            files_total=len(files)
+        )
+        batch.set_files(files)
+        db.session.add(batch)
+        return batch
+
+    def start(self, batch: UploadBatch):
+        """Queue a committed batch for processing"""
+        self._enqueue(batch.id)
+
+    def resume_pending(self):
+        """Requeue batches left queued or processing by a previous run (needs app context)"""
+        batches = UploadBatch.query.filter(
+            UploadBatch.status.in_(('queued', 'processing'))
+        ).order_by(UploadBatch.created_at).all()
+
+        for batch in batches:
+            self._enqueue(batch.id)
+        return len(batches)
+
+    def _enqueue(self, batch_id: str):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._work, name='ingest-worker', daemon=True)
+                self._worker.start()
+        self._queue.put(batch_id)
+
+    def _probe_pool(self) -> ThreadPoolExecutor:
+        # PIL decoding and hashlib release the GIL, threads are enough
+        with self._lock:
+            if self._pool is None:
+                workers = self.app.config.get('INGEST_WORKERS') or os.cpu_count() or 1
+                self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ingest-probe')
+            return self._pool
+
+    def _work(self):
+        while True:
+            batch_id = self._queue.get()
+            try:
+                with self.app.app_context():
+                    try:
+                        self._run(batch_id)
+                    except Exception as e:
+                        self.app.logger.exception('Upload batch %s crashed', batch_id)
+                        self._fail(batch_id, str(e) or e.__class__.__name__)
+            except Exception:
+                self.app.logger.exception('Could not mark upload batch %s as failed', batch_id)
+            finally:
+                self._queue.task_done()
+
+    @staticmethod
+    def _fail(batch_id: str, error: str):
+        """Mark a crashed batch failed, so clients stop polling and it is not resumed"""
+        db.session.rollback()
+        batch = UploadBatch.query.get(batch_id)
+        if batch is None or batch.is_finished:
+            return
+        batch.status = 'failed'
+        batch.error = error
+        batch.finished_at = datetime.utcnow()
+        db.session.commit()
+
+    def _run(self, batch_id: str):
+        batch = UploadBatch.query.get(batch_id)
+        if batch is None or batch.is_finished:
+            return
+
+        project = Project.query.get(batch.project_id)
+        if project is None:
+            batch.status = 'failed'
+            batch.error = f'Project {batch.project_id} not found'
+            batch.finished_at = datetime.utcnow()
+            db.session.commit()
+            return
+
+        batch.status = 'processing'
+        db.session.commit()
+
+        folder = os.path.join(self.app.config['INCOMING_FOLDER'], str(batch.project_id))
+        chunk_size = max(1, self.app.config.get('INGEST_INSERT_CHUNK', 100))
+        link_duplicates = project.duplicate_policy == 'link'
+        self._backfill_hashes(project.id)
+
+        # Files handled before an interruption are not processed twice
+        files = batch.get_files()
+        existing = {filename for (filename,) in db.session.query(Image.filename).filter(
+            Image.project_id == batch.project_id,
+            Image.filename.in_([f['filename'] for f in files])
+        )}
+        errors = batch.get_file_errors()
+        duplicates = batch.get_duplicates()
+        linked = {d['filename'] for d in duplicates}
+        handled = existing | linked | {e['filename'] for e in errors}
+        todo = [f for f in files if f['filename'] not in handled]
+        batch.files_done = len(existing | linked)
+        self._discard(os.path.join(folder, filename) for filename in existing)
+
+        paths = [os.path.join(folder, f['filename']) for f in todo]
+        probes = self._probe_pool().map(_probe_quietly, paths, [f.get('content_hash') for f in todo])
+        rows = []
+        staged = []  # Incoming files of rows not inserted yet
+        new_keys = []  # Blobs of rows not inserted yet that need thumbnails
+        pending = {}  # content hash -> (filename, storage key) of rows not inserted yet
+        for entry, path, (probe, error) in zip(todo, paths, probes):
+            if error is not None:
+                errors.append({'file': entry['original_filename'], 'filename': entry['filename'],
+                               'error': error})
+                self._discard([path])
+                continue
+
+            original = pending.get(probe['content_hash']) or self._find_duplicate(
+                batch.project_id, probe['content_hash'])
+            if original is not None:
+                # Identical content is stored once: a linked image reuses the existing blob
+                report = {'file': entry['original_filename'], 'filename': entry['filename'],
+                          'duplicate_of': original[0]}
+                if not link_duplicates:
+                    errors.append(dict(report, error='Duplicate of an existing image'))
+                    self._discard([path])
+                    continue
+                duplicates.append(report)
+                key = original[1]
+            else:
+                ext = entry['filename'].rsplit('.', 1)[-1]
+                key = blobs.put_file(path, probe['content_hash'], ext)
+                new_keys.append(key)
+                pending[probe['content_hash']] = (entry['filename'], key)
+
+            # The incoming copy is removed once its row is committed
+            staged.append(path)
+            rows.append({
+                'project_id': batch.project_id,
+                'filename': entry['filename'],
+                'original_filename': entry['original_filename'],
+                'storage_key': key,
+                'width': probe['width'],
+                'height': probe['height'],
+                'file_size': probe['file_size'],
+                'content_hash': probe['content_hash'],
+                'uploader_name': batch.uploader_name,
+                'upload_source': batch.upload_source
+            })
+            if len(rows) >= chunk_size:
+                self._insert(batch, rows, errors, duplicates, staged, new_keys)
+                rows, staged, new_keys = [], [], []
+                pending.clear()
+
+        self._insert(batch, rows, errors, duplicates, staged, new_keys)
+
+        batch.status = 'completed'
+        batch.finished_at = datetime.utcnow()
+        db.session.commit()
+
+    @staticmethod
+    def _find_duplicate(project_id: int, content_hash: str) -> Optional[Tuple[str, str]]:
+        """(filename, storage key) of an image of the project with this content (indexed lookup)"""
+        row = db.session.query(Image.filename, Image.storage_key).filter(
+            Image.project_id == project_id,
+            Image.content_hash == content_hash
+        ).order_by(Image.id).first()
+        return tuple(row) if row is not None else None
+
+    def _backfill_hashes(self, project_id: int):
+        """Hash images added before content hashes were recorded (once per project)"""
+        missing = db.session.query(Image.id, Image.storage_key).filter(
+            Image.project_id == project_id,
+            Image.content_hash.is_(None)
+        ).all()
+        missing = [(image_id, blobs.path(key)) for image_id, key in missing if blobs.exists(key)]
+        if not missing:
+            return
+
+        hashes = self._probe_pool().map(file_hash, [path for _, path in missing])
+        db.session.execute(db.update(Image), [
+            {'id': image_id, 'content_hash': digest} for (image_id, _), digest in zip(missing, hashes)
+        ])
+        db.session.commit()
+
+    @classmethod
+    def _insert(cls, batch: UploadBatch, rows: List[Dict], errors: List[Dict], duplicates: List[Dict],
+                staged: List[str], new_keys: List[str]):
+        """Insert a chunk of images and record progress in one transaction"""
+        if rows:
+            db.session.execute(db.insert(Image), rows)
+        batch.files_done += len(rows)
+        batch.files_failed = len(errors)
+        batch.set_file_errors(errors)
+        batch.set_duplicates(duplicates)
+        db.session.commit()
+        cls._discard(staged)
+
+        # Gallery thumbnails are generated in the background; linked images share theirs
+        for key in new_keys:
+            thumbnails.submit(key)
+
+    @staticmethod
+    def _discard(paths: Iterable[str]):
+        """Remove incoming files that are stored elsewhere or rejected"""
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+ingest = IngestQueue()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Export Pipeline Stages
+
+Exports run as a chain of stages - reading source files, augmenting and
+encoding, writing the archive - each on its own thread and connected by
+bounded queues. Disk reads, CPU work and compression overlap, while only a
+few items are buffered between two stages at any time.
+"""
+import queue
+import threading
+from typing import Iterable, Iterator, TypeVar
+
+T = TypeVar('T')
+
+_DONE = object()
+
+
+class _Failure:
+    """Exception raised by a producer, handed to the consumer"""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def stage(items: Iterable[T], depth: int = 4, name: str = 'export-stage') -> Iterator[T]:
+    """
+    Run an iterable on a background thread and yield its items in order
+
+    The producer blocks once depth items are waiting, so a slow consumer
+    holds back the stages before it. Exceptions from the producer are raised
+    in the consumer, and closing the returned generator stops the producer
+    at its next item.
+
+    Args:
+        items: Iterable to run, typically the previous stage's generator
+        depth: Queue size between producer and consumer
+        name: Thread name
+
+    Yields:
+        The items of the iterable
+    """
+    buffer = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        iterator = iter(items)
+        try:
+            for item in iterator:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(_Failure(e))
+        finally:
+            # Let generators of earlier stages run their cleanup
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+"""
+Project Archive Exporter Service
+
+Streams the archive served by POST /api/projects/<id>/export. Entries are
+written into a ZipStream as they are produced, so memory use does not grow
+with the size of the dataset. Source files are read and augmented on
+pipeline stages running ahead of the zip writer.
+"""
+import os
+import json
+import numpy as np
+from io import BytesIO
+from typing import Iterator, List, Optional, Tuple
+from flask import current_app
+from PIL import Image as PILImage, ImageEnhance, ImageFilter
+from app.models import Project, Image
+from app.services.augment_pool import AugmentationPool
+from app.services.augmentation import sample_rng
+from app.services.augment_cache import augment_cache
+from app.utils.file import file_hash
+from app.services.export_data import load_export_data
+from app.services.pipeline import stage
+from app.utils.zipstream import ZipStream
+
+
+# Frontend augmentation switches -> augmentation type
+AUGMENTATION_OPTIONS = [
+    ('flipHorizontal', 'flip_h'),
+    ('flipVertical', 'flip_v'),
+    ('rotate90', 'rotate90'),
+    ('brightness', 'brightness'),
+    ('contrast', 'contrast'),
+    ('blur', 'blur'),
+    ('noise', 'noise'),
+]
+
+
+def apply_augmentation(pil_image, aug_type, rng=None):
+    """Apply augmentation to image and return transformation info for labels"""
+    if rng is None:
+        rng = np.random.default_rng()
+    if aug_type == 'flip_h':
+        return pil_image.transpose(PILImage.FLIP_LEFT_RIGHT), 'flip_h'
+    elif aug_type == 'flip_v':
+        return pil_image.transpose(PILImage.FLIP_TOP_BOTTOM), 'flip_v'
+    elif aug_type == 'rotate90':
+        return pil_image.transpose(PILImage.ROTATE_270), 'rotate90'  # Clockwise 90
+    elif aug_type == 'brightness':
+        factor = rng.uniform(0.8, 1.2)
+        enhancer = ImageEnhance.Brightness(pil_image)
+        return enhancer.enhance(factor), 'none'  # No label change
+    elif aug_type == 'contrast':
+        factor = rng.uniform(0.8, 1.2)
+        enhancer = ImageEnhance.Contrast(pil_image)
+        return enhancer.enhance(factor), 'none'
+    elif aug_type == 'blur':
+        return pil_image.filter(ImageFilter.GaussianBlur(radius=1)), 'none'
+    elif aug_type == 'noise':
+        # Add random noise
+        img_array = np.array(pil_image)
+        noise = rng.integers(-15, 15, img_array.shape, dtype=np.int16)
+        noisy = np.clip(img_array.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+        return PILImage.fromarray(noisy), 'none'
+    return pil_image, 'none'
+
+
+def transform_yolo_label(x_center, y_center, w, h, transform_type, img_w, img_h):
+    """Transform YOLO label based on augmentation type"""
+    if transform_type == 'flip_h':
+        # Horizontal flip: mirror x coordinate
+        return 1.0 - x_center, y_center, w, h
+    elif transform_type == 'flip_v':
+        # Vertical flip: mirror y coordinate
+        return x_center, 1.0 - y_center, w, h
+    elif transform_type == 'rotate90':
+        # Rotate 90 degrees clockwise: (x,y) -> (1-y, x), swap w/h
+        return 1.0 - y_center, x_center, h, w
+    return x_center, y_center, w, h
+
+
+def augment_image_task(file_path: str, aug_types: List[str], multiplier: int,
+                       image_id: int, seed: Optional[int] = None) -> List[tuple]:
+    """
+    Augment one image for every aug type x multiplier (runs in a worker process)
+
+    Sample n draws from sample_rng(seed, image_id, n), so seeded exports are
+    reproducible regardless of which worker runs the task.
+
+    Returns:
+        List of (aug_type, mult_idx, jpeg_bytes, transform)
+    """
+    pil_img = PILImage.open(file_path)
+    if pil_img.mode != 'RGB':
+        pil_img = pil_img.convert('RGB')
+
+    samples = []
+    for aug_type in aug_types:
+        for mult_idx in range(multiplier):
+            rng = sample_rng(seed, image_id, len(samples))
+            aug_img, transform = apply_augmentation(pil_img.copy(), aug_type, rng)
+
+            img_buffer = BytesIO()
+            aug_img.save(img_buffer, format='JPEG', quality=95)
+            samples.append((aug_type, mult_idx, img_buffer.getvalue(), transform))
+    return samples
+
+
+class ProjectExporter:
+    """Export a project as a streamed ZIP archive"""
+
+    FORMATS = ('yolo', 'coco', 'voc', 'csv')
+
+    def __init__(self, project: Project, options: dict):
+        """
+        Initialize exporter from the export request body
+
+        Args:
+            project: Project to export
+            options: Request options
+                - format: yolo, coco, voc, csv
+                - includeImages: bool
+                - onlyAnnotated: bool
+                - augmentation: dict with 'enabled', 'multiplier', optional
+                  'seed' and switches
+        """
+        self.project = project
+        self.format_type = options.get('format', 'yolo')
+        self.include_images = options.get('includeImages', True)
+        self.only_annotated = options.get('onlyAnnotated', False)
+
+        # Augmentation settings
+        augmentation = options.get('augmentation', {})
+        self.aug_enabled = augmentation.get('enabled', False)
+        self.aug_multiplier = augmentation.get('multiplier', 1)
+        self.aug_seed = augmentation.get('seed')
+        self.aug_types = []
+        if self.aug_enabled:
+            self.aug_types = [aug_type for key, aug_type in AUGMENTATION_OPTIONS if augmentation.get(key)]
+
+        # Images, classes and annotations in a few bulk queries
+        self.data = load_export_data(project, only_annotated=self.only_annotated)
+        self.images = self.data.images
+        self.classes = self.data.classes
+        self.class_map = self.data.class_index()
+        self.images_done = 0
+
+        # Augmentation runs in worker processes while the archive is written
+        self.pool = AugmentationPool.from_config(current_app.config)
+        self.pipeline_depth = current_app.config.get('EXPORT_PIPELINE_DEPTH', 8)
+
+    @property
+    def download_name(self) -> str:
+        return f'{self.project.name}_{self.format_type}.zip'
+
+    def iter_zip(self) -> Iterator[bytes]:
+        """Generate the archive, yielding bytes as each entry is written"""
+        zs = ZipStream()
+
+        if self.format_type == 'yolo':
+            yield from self._write_yolo(zs)
+        elif self.format_type == 'coco':
+            yield from self._write_coco(zs)
+        elif self.format_type == 'voc':
+            yield from self._write_voc(zs)
+        elif self.format_type == 'csv':
+            yield from self._write_csv(zs)
+
+        yield from zs.close()
+
+    def _read_file(self, image: Image) -> Optional[bytes]:
+        """Original file content, or None when images are left out or missing"""
+        if self.include_images and os.path.exists(image.file_path):
+            with open(image.file_path, 'rb') as f:
+                return f.read()
+        return None
+
+    def _write_image(self, zs: ZipStream, arcname: str, data: Optional[bytes]) -> Iterator[bytes]:
+        if data is not None:
+            yield from zs.writestr(arcname, data)
+
+    def _read_images(self) -> Iterator[Tuple[Image, Optional[bytes]]]:
+        """Images with their file content, read on a pipeline stage ahead of the writer"""
+        return stage(((image, self._read_file(image)) for image in self.images),
+                     self.pipeline_depth, 'export-reader')
+
+    def _cache_keys(self, image: Image) -> Optional[List[str]]:
+        """Augmentation cache keys in task sample order (None when not cacheable)"""
+        if self.aug_seed is None or not augment_cache.enabled:
+            return None
+        source_hash = image.content_hash or file_hash(image.file_path)
+        keys = []
+        for aug_type in self.aug_types:
+            for mult_idx in range(self.aug_multiplier):
+                keys.append(augment_cache.make_key('archive', source_hash, {'aug_type': aug_type},
+                                                   self.aug_seed, image.id, len(keys)))
+        return keys
+
+    def _augmentation_tasks(self) -> Iterator[Tuple[tuple, Optional[tuple]]]:
+        """
+        Pair each image with its augmentation task args (only training images are augmented)
+
+        Images whose samples are all in the augmentation cache need no task.
+
+        Yields:
+            ((image, cache keys, cached samples), task args or None)
+        """
+        for image in self.images:
+            split = image.split or 'train'
+            if not (self.aug_enabled and self.aug_types and split == 'train' and os.path.exists(image.file_path)):
+                yield (image, None, None), None
+                continue
+
+            keys = self._cache_keys(image)
+            if keys:
+                cached = [augment_cache.get(key) for key in keys]
+                if all(cached):
+                    samples = [(meta['aug_type'], meta['mult_idx'], jpeg_bytes, meta['transform'])
+                               for jpeg_bytes, meta in cached]
+                    yield (image, keys, samples), None
+                    continue
+
+            yield (image, keys, None), (image.file_path, self.aug_types, self.aug_multiplier, image.id, self.aug_seed)
+
+    def _read_sources(self) -> Iterator[Tuple[tuple, Optional[tuple]]]:
+        """Reader stage: augmentation tasks with the original file content added"""
+        for (image, keys, cached), args in self._augmentation_tasks():
+            yield (image, self._read_file(image), keys, cached), args
+
+    def _augmented_samples(self) -> Iterator[Tuple[Image, Optional[bytes], Optional[List[tuple]],
+                                                   Optional[Exception]]]:
+        """
+        Run the reader and augmentation stages, serving and filling the augmentation cache
+
+        Yields:
+            (image, original file content, samples, error)
+        """
+        depth = self.pipeline_depth
+        sources = stage(self._read_sources(), depth, 'export-reader')
+        augmented = stage(self.pool.imap(augment_image_task, sources), depth, 'export-augment')
+
+        for (image, data, keys, cached), samples, error in augmented:
+            if cached is not None:
+                samples = cached
+            elif samples and keys:
+                for key, (aug_type, mult_idx, jpeg_bytes, transform) in zip(keys, samples):
+                    augment_cache.put(key, jpeg_bytes,
+                                      {'aug_type': aug_type, 'mult_idx': mult_idx, 'transform': transform})
+            yield image, data, samples, error
+
+    def _write_yolo(self, zs: ZipStream) -> Iterator[bytes]:
+        """YOLO format (Ultralytics compatible)"""
+        classes = self.classes
+        class_map = self.class_map
+
+        class_names = '\n'.join([c.name for c in classes])
+        yield from zs.writestr('classes.txt', class_names)
+
+        names_yaml = '\n'.join([f'  {i}: {c.name}' for i, c in enumerate(classes)])
+        yaml_content = f"""# Ultralytics YOLO dataset config
+path: .
+train: images/train
+val: images/val
+test: images/test
+
+nc: {len(classes)}
+names:
+{names_yaml}
+"""
+        yield from zs.writestr('data.yaml', yaml_content)
+
+        for image, data, samples, error in self._augmented_samples():
+            split = image.split or 'train'
+            base_name = os.path.splitext(image.filename)[0]
+
+            annotations = self.data.annotations_for(image)
+
+            # Prepare original YOLO labels
+            def get_yolo_labels(transform_type='none'):
+                label_lines = []
+                for anno in annotations:
+                    if anno.class_id in class_map:
+                        class_idx = class_map[anno.class_id]
+                        d = anno.get_data()
+                        x_center = (d['x'] + d['width'] / 2) / image.width
+                        y_center = (d['y'] + d['height'] / 2) / image.height
+                        w = d['width'] / image.width
+                        h = d['height'] / image.height
+
+                        # Transform if needed
+                        x_center, y_center, w, h = transform_yolo_label(
+                            x_center, y_center, w, h, transform_type, image.width, image.height
+                        )
+                        label_lines.append(f"{class_idx} {x_center:.6f} {y_center:.6f} {w:.6f} {h:.6f}")
+                return '\n'.join(label_lines)
+
+            # Add original image and label
+            yield from self._write_image(zs, f'images/{split}/{image.filename}', data)
+            yield from zs.writestr(f'labels/{split}/{base_name}.txt', get_yolo_labels())
+
+            # Augmented samples (training set only)
+            if error is not None:
+                print(f"Augmentation failed for {image.filename}: {error}")
+
+            for aug_type, mult_idx, jpeg_bytes, transform in samples or []:
+                suffix = f"_{aug_type}_{mult_idx}" if self.aug_multiplier > 1 else f"_{aug_type}"
+                yield from zs.writestr(f'images/{split}/{base_name}{suffix}.jpg', jpeg_bytes)
+                yield from zs.writestr(f'labels/{split}/{base_name}{suffix}.txt', get_yolo_labels(transform))
+
+            self.images_done += 1
+
+    def _write_coco(self, zs: ZipStream) -> Iterator[bytes]:
+        """COCO format"""
+        coco_data = {
+            'images': [],
+            'annotations': [],
+            'categories': [{'id': i, 'name': c.name} for i, c in enumerate(self.classes)]
+        }
+
+        anno_id = 1
+        for img_idx, (image, data) in enumerate(self._read_images()):
+            coco_data['images'].append({
+                'id': img_idx,
+                'file_name': image.filename,
+                'width': image.width,
+                'height': image.height
+            })
+
+            yield from self._write_image(zs, f'images/{image.filename}', data)
+
+            for anno in self.data.annotations_for(image):
+                if anno.class_id in self.class_map:
+                    d = anno.get_data()
+                    coco_data['annotations'].append({
+                        'id': anno_id,
+                        'image_id': img_idx,
+                        'category_id': self.class_map[anno.class_id],
+                        'bbox': [d['x'], d['y'], d['width'], d['height']],
+                        'area': d['width'] * d['height'],
+                        'iscrowd': 0
+                    })
+                    anno_id += 1
+
+            self.images_done += 1
+
+        yield from zs.writestr('annotations.json', json.dumps(coco_data, indent=2))
+
+    def _write_voc(self, zs: ZipStream) -> Iterator[bytes]:
+        """Pascal VOC format"""
+        for image, data in self._read_images():
+            yield from self._write_image(zs, f'JPEGImages/{image.filename}', data)
+
+            xml_content = f"""<annotation>
+    <folder>JPEGImages</folder>
+    <filename>{image.filename}</filename>
+    <size>
+        <width>{image.width}</width>
+        <height>{image.height}</height>
+        <depth>3</depth>
+    </size>
+"""
+            for anno in self.data.annotations_for(image):
+                class_name = self.data.class_name(anno.class_id)
+                if class_name:
+                    d = anno.get_data()
+                    xml_content += f"""    <object>
+        <name>{class_name}</name>
+        <bndbox>
+            <xmin>{int(d['x'])}</xmin>
+            <ymin>{int(d['y'])}</ymin>
+            <xmax>{int(d['x'] + d['width'])}</xmax>
+            <ymax>{int(d['y'] + d['height'])}</ymax>
+        </bndbox>
+    </object>
+"""
+            xml_content += "</annotation>"
+            xml_filename = os.path.splitext(image.filename)[0] + '.xml'
+            yield from zs.writestr(f'Annotations/{xml_filename}', xml_content)
+            self.images_done += 1
+
+    def _write_csv(self, zs: ZipStream) -> Iterator[bytes]:
+        """CSV format"""
+        csv_lines = ['image,class,x,y,width,height']
+        for image, data in self._read_images():
+            yield from self._write_image(zs, f'images/{image.filename}', data)
+
+            for anno in self.data.annotations_for(image):
+                class_name = self.data.class_name(anno.class_id)
+                if class_name:
+                    d = anno.get_data()
+                    csv_lines.append(f"{image.filename},{class_name},{d['x']},{d['y']},{d['width']},{d['height']}")
+
+            self.images_done += 1
+
+        yield from zs.writestr('annotations.csv', '\n'.join(csv_lines))
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+File Reclamation
+
+Deleting images only removes database rows; their files are handed to a
+background thread here, so a request deleting a large project returns as
+soon as its transaction commits. Blobs can be shared by several images, so
+a blob is only removed once no image row references it.
+
+collect_garbage() reconciles the data directory with the images table and
+removes what nothing references any more: blobs, files of unmigrated
+images, thumbnails of deleted images or of an older thumbnail format,
+incoming files no upload batch will pick up and export job archives whose
+job is gone. It runs periodically on the
+same thread and from `flask storage gc`. Files younger than
+STORAGE_GC_GRACE are left alone, as they may belong to an upload whose
+rows are not committed yet.
+"""
+import os
+import re
+import json
+import time
+import queue
+import shutil
+import threading
+from typing import Dict, Iterable, List, Optional
+from flask import Flask
+from app.extensions import db
+from app.models import ChunkedUpload, ExportJob, Image, UploadBatch
+from app.storage import BLOB_PREFIX, blobs
+from .thumbnails import thumbnails, THUMBNAIL_SIZES
+
+
+# Archives written by export jobs are named after the job id
+_JOB_ARCHIVE = re.compile(r'^[0-9a-f]{32}\.zip$')
+
+
+class FileReclaimer:
+    """Removes files of deleted images on a background thread"""
+
+    CHUNK_SIZE = 500  # Storage keys checked for references per query
+
+    def __init__(self, app: Flask = None):
+        self.app = None
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        self.app = app
+        app.extensions['reclaimer'] = self
+
+    @property
+    def grace(self) -> float:
+        return self.app.config.get('STORAGE_GC_GRACE', 3600)
+
+    def submit(self, keys: Iterable[str] = (), paths: Iterable[str] = ()):
+        """
+        Queue files of deleted rows for removal
+
+        Args:
+            keys: Storage keys of deleted images; removed with their
+                thumbnails unless another image still references them
+            paths: Files or directories removed unconditionally (export
+                artifacts, folders of a deleted project)
+        """
+        self._enqueue((list(keys), list(paths)))
+
+    def start(self):
+        """Start the worker so periodic garbage collection runs without deletions"""
+        self._ensure_worker()
+
+    def _enqueue(self, item):
+        self._ensure_worker()
+        self._queue.put(item)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._work, name='file-reclaimer', daemon=True)
+                self._worker.start()
+
+    def _work(self):
+        interval = self.app.config.get('STORAGE_GC_INTERVAL', 6 * 3600)
+        next_gc = time.monotonic() + interval if interval else None
+        while True:
+            timeout = None if next_gc is None else max(0.0, next_gc - time.monotonic())
+            try:
+                keys, paths = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                try:
+                    with self.app.app_context():
+                        counts = self.collect_garbage()
+                    if counts['files']:
+                        print(f"Storage GC removed {counts['files']} files ({counts['bytes']} bytes)")
+                except Exception as e:
+                    print(f"Storage GC crashed: {e}")
+                next_gc = time.monotonic() + interval
+                continue
+
+            try:
+                with self.app.app_context():
+                    self._reclaim(keys, paths)
+            except Exception as e:
+                print(f"File reclamation crashed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _reclaim(self, keys: List[str], paths: List[str]):
+        for path in paths:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+
+        for start in range(0, len(keys), self.CHUNK_SIZE):
+            chunk = keys[start:start + self.CHUNK_SIZE]
+            referenced = {key for (key,) in db.session.query(Image.storage_key).filter(
+                Image.storage_key.in_(chunk)
+            ).distinct()}
+            db.session.rollback()  # Do not hold a read transaction while deleting files
+
+            for key in chunk:
+                if key in referenced:
+                    continue
+                # A blob reused by an upload in the meantime is left to the next GC
+                older_than = self.grace if blobs.is_blob_key(key) else None
+                if blobs.delete(key, older_than=older_than) or not blobs.exists(key):
+                    thumbnails.remove(key)
+
+    def collect_garbage(self, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Remove files no row references (needs app context)
+
+        Args:
+            dry_run: Only count what would be removed
+
+        Returns:
+            Counts of removed 'blobs', 'uploads' (unmigrated image files),
+            'thumbnails', 'incoming' files and job 'exports', their total
+            'files' and 'bytes'
+        """
+        keys = {key for (key,) in db.session.query(Image.storage_key).distinct()}
+        active = self._active_incoming()
+        archives = {os.path.basename(path) for (path,) in db.session.query(ExportJob.file_path).filter(
+            ExportJob.file_path.isnot(None)
+        )}
+        db.session.rollback()
+
+        blob_stems = {key.rsplit('.', 1)[0] for key in keys if blobs.is_blob_key(key)}
+        # Unmigrated rows hold absolute paths that break when DATA_DIR moves; match by name
+        legacy_names = {os.path.basename(key) for key in keys if not blobs.is_blob_key(key)}
+        legacy_stems = {os.path.splitext(name)[0] for name in legacy_names}
+
+        counts = {'blobs': 0, 'uploads': 0, 'thumbnails': 0, 'incoming': 0, 'exports': 0,
+                  'files': 0, 'bytes': 0}
+
+        def remove(kind: str, path: str, key: Optional[str] = None):
+            size = os.path.getsize(path)
+            if not dry_run:
+                if key is not None:
+                    if not blobs.delete(key, older_than=self.grace):
+                        return
+                else:
+                    os.remove(path)
+            counts[kind] += 1
+            counts['files'] += 1
+            counts['bytes'] += size
+
+        for key in blobs.iter_keys():
+            path = blobs.path(key)
+            if key not in keys and self._is_stale(path):
+                remove('blobs', path, key)
+
+        for path in self._walk(self.app.config['UPLOAD_FOLDER']):
+            if os.path.basename(path) not in legacy_names and self._is_stale(path):
+                remove('uploads', path)
+
+        for size in THUMBNAIL_SIZES:
+            size_folder = os.path.join(thumbnails.folder, str(size))
+            for path in self._walk(size_folder):
+                stem, ext = os.path.splitext(os.path.relpath(path, size_folder).replace(os.sep, '/'))
+                if stem.startswith(f'{BLOB_PREFIX}/'):
+                    wanted = stem in blob_stems
+                else:
+                    wanted = os.path.basename(stem) in legacy_stems
+                if (not wanted or ext != f'.{thumbnails.extension}') and self._is_stale(path):
+                    remove('thumbnails', path)
+
+        incoming = self.app.config['INCOMING_FOLDER']
+        for path in self._walk(incoming):
+            if os.path.relpath(path, incoming).replace(os.sep, '/') not in active and self._is_stale(path):
+                remove('incoming', path)
+
+        export_folder = self.app.config['EXPORT_FOLDER']
+        for name in os.listdir(export_folder) if os.path.isdir(export_folder) else ():
+            path = os.path.join(export_folder, name)
+            if _JOB_ARCHIVE.match(name) and name not in archives and self._is_stale(path):
+                remove('exports', path)
+
+        if not dry_run:
+            for folder in (self.app.config['UPLOAD_FOLDER'], thumbnails.folder, incoming):
+                self._remove_empty_dirs(folder)
+        return counts
+
+    @staticmethod
+    def _active_incoming() -> set:
+        """'<project_id>/<name>' of incoming files still waiting for ingestion"""
+        active = set()
+        batches = db.session.query(UploadBatch.project_id, UploadBatch.files).filter(
+            UploadBatch.status.in_(('queued', 'processing'))
+        )
+        for project_id, files in batches:
+            active.update(f"{project_id}/{f['filename']}" for f in json.loads(files or '[]'))
+
+        uploads = db.session.query(ChunkedUpload.project_id, ChunkedUpload.filename).filter(
+            ChunkedUpload.status == 'uploading'
+        )
+        active.update(f'{project_id}/{filename}.part' for project_id, filename in uploads)
+        return active
+
+    def _is_stale(self, path: str) -> bool:
+        try:
+            return time.time() - os.path.getmtime(path) >= self.grace
+        except OSError:
+            return False
+
+    @staticmethod
+    def _walk(folder: str) -> Iterable[str]:
+        for root, _, files in os.walk(folder):
+            for name in files:
+                yield os.path.join(root, name)
+
+    @staticmethod
+    def _remove_empty_dirs(folder: str):
+        """Remove empty directories below folder, keeping folder itself"""
+        for root, _, _ in os.walk(folder, topdown=False):
+            if root != folder:
+                try:
+                    os.rmdir(root)
+                except OSError:
+                    pass
+
+
+reclaimer = FileReclaimer()
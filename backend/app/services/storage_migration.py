@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Storage Migration
+
+Moves images stored before blob storage existed (absolute paths under
+uploads/<project_id>/) into the content-addressed blob store and rewrites
+their rows to relative storage keys. Safe to interrupt and run again: rows
+are committed in chunks and old files are only removed after their rows
+point at the blob.
+"""
+import os
+from typing import Callable, Dict, Optional
+from app.extensions import db
+from app.models import Image
+from app.storage import blobs
+from app.utils.file import file_hash
+from .thumbnails import thumbnails
+
+
+def migrate_to_blobs(project_id: Optional[int] = None, dry_run: bool = False,
+                     chunk_size: int = 200, log: Callable[[str], None] = print) -> Dict[str, int]:
+    """
+    Move legacy image files into blob storage (needs app context)
+
+    Args:
+        project_id: Only migrate this project
+        dry_run: Only count what would be migrated
+        chunk_size: Images per transaction
+        log: Receives one line per missing file
+
+    Returns:
+        Counts of 'migrated', 'missing' and 'skipped' (already in blob storage) images
+    """
+    query = db.session.query(Image.id).order_by(Image.id)
+    if project_id is not None:
+        query = query.filter(Image.project_id == project_id)
+    image_ids = [image_id for (image_id,) in query]
+
+    counts = {'migrated': 0, 'missing': 0, 'skipped': 0}
+    for start in range(0, len(image_ids), chunk_size):
+        moved = []  # Old keys of migrated rows
+        for image in Image.query.filter(Image.id.in_(image_ids[start:start + chunk_size])):
+            if blobs.is_blob_key(image.storage_key):
+                counts['skipped'] += 1
+                continue
+
+            path = image.file_path
+            if not os.path.isfile(path):
+                log(f"Missing file for image {image.id}: {path}")
+                counts['missing'] += 1
+                continue
+
+            counts['migrated'] += 1
+            if dry_run:
+                continue
+
+            content_hash = image.content_hash or file_hash(path)
+            ext = image.filename.rsplit('.', 1)[-1] if '.' in image.filename else 'jpg'
+            moved.append(image.storage_key)
+            image.storage_key = blobs.put_file(path, content_hash, ext)
+            image.content_hash = content_hash
+
+        if moved:
+            _commit(moved)
+    return counts
+
+
+def _commit(old_keys):
+    """Commit migrated rows, then drop their old files and thumbnails"""
+    db.session.commit()
+    # Images linked to the same upload are migrated later from the same file
+    shared = {key for (key,) in db.session.query(Image.storage_key).filter(Image.storage_key.in_(old_keys))}
+    for key in set(old_keys) - shared:
+        thumbnails.remove(key)
+        blobs.delete(key)
+
+        # Remove uploads/<project_id> once it is empty
+        folder = os.path.dirname(blobs.path(key))
+        if os.path.isdir(folder) and not os.listdir(folder):
+            os.rmdir(folder)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Thumbnail Service
+
+Keeps downscaled copies of uploaded images under DATA_DIR/thumbnails, so
+galleries do not have to load the original photos. Thumbnails are generated
+in the background right after upload and lazily on first request for images
+that do not have them yet.
+
+Thumbnails are keyed by the image's storage key, so identical content shares
+its thumbnails across projects:
+
+    <THUMBNAIL_FOLDER>/<size>/blobs/ab/cd/<hash>.<webp|jpg>
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+from flask import Flask
+from PIL import Image as PILImage, ImageOps, features
+from app.storage import blobs
+
+
+THUMBNAIL_SIZES = (128, 256, 1024)  # Longest side in pixels
+
+
+class ThumbnailService:
+    """Generates and locates image thumbnails"""
+
+    def __init__(self, app: Flask = None):
+        self.folder = None
+        self.format = 'jpeg'
+        self.quality = 80
+        self._executor = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        self.folder = app.config['THUMBNAIL_FOLDER']
+        self.quality = app.config.get('THUMBNAIL_QUALITY', 80)
+        self.workers = app.config.get('THUMBNAIL_WORKERS', 2)
+
+        # WebP is much smaller, but Pillow may be built without it
+        fmt = app.config.get('THUMBNAIL_FORMAT', 'webp').lower()
+        self.format = fmt if fmt != 'webp' or features.check('webp') else 'jpeg'
+
+        os.makedirs(self.folder, exist_ok=True)
+        app.extensions['thumbnails'] = self
+
+    @property
+    def extension(self) -> str:
+        return 'webp' if self.format == 'webp' else 'jpg'
+
+    @property
+    def mimetype(self) -> str:
+        return f'image/{self.format}'
+
+    @staticmethod
+    def pick_size(requested: Optional[int]) -> int:
+        """Smallest generated size covering the requested one (default 256)"""
+        if not requested:
+            return 256
+        for size in THUMBNAIL_SIZES:
+            if size >= requested:
+                return size
+        return THUMBNAIL_SIZES[-1]
+
+    def path(self, key: str, size: int) -> str:
+        """Thumbnail path of a storage key (legacy keys map below uploads/<project_id>/)"""
+        relative = os.path.relpath(blobs.path(key), blobs.data_dir)
+        stem = os.path.splitext(relative)[0]
+        return os.path.join(self.folder, str(size), f'{stem}.{self.extension}')
+
+    def generate(self, key: str, sizes: Iterable[int] = THUMBNAIL_SIZES) -> List[str]:
+        """
+        Write the thumbnails of one image
+
+        The source is decoded once (JPEGs at reduced size via draft mode) and
+        each size is resized from the next larger one.
+
+        Returns:
+            Paths of the written thumbnails
+        """
+        sizes = sorted(sizes, reverse=True)
+        written = []
+        with PILImage.open(blobs.path(key)) as img:
+            img.draft('RGB', (sizes[0], sizes[0]))
+            img = ImageOps.exif_transpose(img)
+
+            # WebP keeps transparency, JPEG needs RGB
+            mode = 'RGBA' if self.format == 'webp' and 'A' in img.getbands() else 'RGB'
+            if img.mode != mode:
+                img = img.convert(mode)
+
+            save_args = {'quality': self.quality}
+            if self.format == 'webp':
+                save_args['method'] = 4
+
+            for size in sizes:
+                img.thumbnail((size, size), PILImage.LANCZOS)
+                path = self.path(key, size)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+
+                # Write under a temporary name so readers never see a partial file
+                tmp_path = f'{path}.{threading.get_ident()}.tmp'
+                img.save(tmp_path, format=self.format.upper(), **save_args)
+                os.replace(tmp_path, path)
+                written.append(path)
+        return written
+
+    def get(self, key: str, size: int) -> Optional[str]:
+        """Path of a thumbnail, generated on the spot when missing (None if the source is unreadable)"""
+        path = self.path(key, size)
+        if os.path.exists(path):
+            return path
+        try:
+            self.generate(key)
+        except (OSError, ValueError) as e:
+            print(f"Thumbnail generation failed for {key}: {e}")
+            return None
+        return path if os.path.exists(path) else None
+
+    def submit(self, key: str):
+        """Generate the thumbnails of a new upload in the background"""
+        self._background().submit(self._generate_quietly, key)
+
+    def remove(self, key: str):
+        """Delete the thumbnails of an image"""
+        for size in THUMBNAIL_SIZES:
+            path = self.path(key, size)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _generate_quietly(self, key: str):
+        try:
+            self.generate(key)
+        except Exception as e:
+            print(f"Thumbnail generation failed for {key}: {e}")
+
+    def _background(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix='thumbnail')
+            return self._executor
+
+
+thumbnails = ThumbnailService()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Blob Storage
+
+Image files are stored once per content, named by their SHA-256 and sharded
+by hash prefix so no directory grows beyond a few thousand entries:
+
+    <DATA_DIR>/blobs/ab/cd/abcd1234....jpg
+
+Database rows hold storage keys relative to DATA_DIR ('blobs/ab/cd/...'),
+so the data directory can be moved. Rows written before blob storage hold
+absolute paths under uploads/<project_id>/; path() still resolves them and
+`flask storage migrate` moves them into the blob store.
+"""
+import os
+import re
+import shutil
+import time
+import threading
+from typing import Iterator, Optional
+from flask import Flask
+
+
+BLOB_PREFIX = 'blobs'
+
+_BLOB_NAME = re.compile(r'^[0-9a-f]{64}\.[0-9a-z]+$')
+
+
+class BlobStore:
+    """Content-addressed file store under DATA_DIR/blobs"""
+
+    def __init__(self, app: Flask = None):
+        self.data_dir = None
+        self.root = None
+        self._lock = threading.Lock()  # Orders reuse of a blob against its deletion
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        self.data_dir = app.config['DATA_DIR']
+        self.root = os.path.join(self.data_dir, BLOB_PREFIX)
+        os.makedirs(self.root, exist_ok=True)
+        app.extensions['blobs'] = self
+
+    @staticmethod
+    def key_for(content_hash: str, ext: str) -> str:
+        """Storage key of a blob: blobs/<h[:2]>/<h[2:4]>/<hash>.<ext>"""
+        return '/'.join((BLOB_PREFIX, content_hash[:2], content_hash[2:4], f'{content_hash}.{ext.lower()}'))
+
+    @staticmethod
+    def is_blob_key(key: Optional[str]) -> bool:
+        return bool(key) and key.startswith(f'{BLOB_PREFIX}/') and bool(_BLOB_NAME.match(key.rsplit('/', 1)[-1]))
+
+    @classmethod
+    def hash_of(cls, key: str) -> Optional[str]:
+        """Content hash encoded in a blob key (None for legacy paths)"""
+        if not cls.is_blob_key(key):
+            return None
+        return key.rsplit('/', 1)[-1].split('.', 1)[0]
+
+    def path(self, key: str) -> str:
+        """Absolute path of a storage key; legacy absolute paths are returned as they are"""
+        if os.path.isabs(key):
+            return key
+        return os.path.join(self.data_dir, *key.split('/'))
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self.path(key))
+
+    def put_file(self, src_path: str, content_hash: str, ext: str) -> str:
+        """
+        Store a file under its content hash
+
+        The source is hard-linked (copied where links are not supported), so
+        the caller decides when to remove it. Storing content that already
+        exists only refreshes the blob's mtime, which keeps delete() with
+        older_than from reclaiming it before the new row is committed.
+
+        Returns:
+            Storage key of the blob
+        """
+        key = self.key_for(content_hash, ext)
+        dst = self.path(key)
+        with self._lock:
+            if os.path.exists(dst):
+                os.utime(dst)
+                return key
+
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp_path = f'{dst}.{threading.get_ident()}.tmp'
+        try:
+            os.link(src_path, tmp_path)
+        except OSError:
+            shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, dst)
+        return key
+
+    def delete(self, key: str, older_than: Optional[float] = None) -> bool:
+        """
+        Remove a blob (or legacy file) if it exists
+
+        Args:
+            key: Storage key
+            older_than: Keep the blob if it was stored or reused within this
+                many seconds; it may belong to a row not committed yet
+
+        Returns:
+            Whether a file was removed
+        """
+        path = self.path(key)
+        with self._lock:
+            try:
+                if older_than is not None and time.time() - os.path.getmtime(path) < older_than:
+                    return False
+                os.remove(path)
+            except FileNotFoundError:
+                return False
+        return True
+
+    def iter_keys(self) -> Iterator[str]:
+        """Storage keys of all blobs on disk"""
+        for shard in sorted(os.listdir(self.root)) if os.path.isdir(self.root) else ():
+            shard_path = os.path.join(self.root, shard)
+            if not os.path.isdir(shard_path):
+                continue
+            for sub in sorted(os.listdir(shard_path)):
+                sub_path = os.path.join(shard_path, sub)
+                if not os.path.isdir(sub_path):
+                    continue
+                for name in os.listdir(sub_path):
+                    if _BLOB_NAME.match(name):
+                        yield '/'.join((BLOB_PREFIX, shard, sub, name))
+
+
+blobs = BlobStore()
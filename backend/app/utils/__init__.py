@@ -3,6 +3,10 @@
 Utility Functions
 """
 from .network import get_local_ip
-from .file import allowed_file, save_uploaded_file
+from .file import allowed_file, save_uploaded_file, file_hash
+from .zipstream import ZipStream, compress_type_for, stream_zip_response
+from .http import file_etag, send_immutable_file, send_revalidated_file
 
-__all__ = ['get_local_ip', 'allowed_file', 'save_uploaded_file']
+__all__ = ['get_local_ip', 'allowed_file', 'save_uploaded_file', 'file_hash', 'ZipStream',
+           'compress_type_for', 'stream_zip_response', 'file_etag', 'send_immutable_file',
+           'send_revalidated_file']
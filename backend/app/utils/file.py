@@ -4,6 +4,8 @@ File Utilities
 """
 import os
 import uuid
+import hashlib
+from typing import Tuple
 from flask import current_app
 from werkzeug.utils import secure_filename
 
@@ -17,24 +19,38 @@ def allowed_file(filename: str) -> bool:
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def save_uploaded_file(file, project_id: int) -> str:
+def file_hash(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 hex digest of a file's content"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_uploaded_file(file, project_id: int, chunk_size: int = 1024 * 1024) -> Tuple[str, str]:
     """
-    Save uploaded file with unique filename
+    Save uploaded file with unique filename to the incoming folder, hashing
+    it while it is written (ingestion moves it into blob storage)
 
     Args:
         file: FileStorage object
         project_id: Project ID
 
     Returns:
-        Saved filename
+        (saved filename, SHA-256 hex digest of the content)
     """
     ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else 'jpg'
     filename = f"{uuid.uuid4().hex}.{ext}"
 
-    project_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], str(project_id))
+    project_folder = os.path.join(current_app.config['INCOMING_FOLDER'], str(project_id))
     os.makedirs(project_folder, exist_ok=True)
 
     file_path = os.path.join(project_folder, filename)
-    file.save(file_path)
+    digest = hashlib.sha256()
+    with open(file_path, 'wb') as f:
+        for chunk in iter(lambda: file.stream.read(chunk_size), b''):
+            digest.update(chunk)
+            f.write(chunk)
 
-    return filename
+    return filename, digest.hexdigest()
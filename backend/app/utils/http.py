@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP Caching Utilities
+
+Blobs are named by their content hash and legacy uploads by random names,
+so a URL built from either always returns the same bytes. Those responses
+carry a strong ETag derived from the file content and an immutable
+Cache-Control header, so browsers keep them instead of revalidating on every
+page. URLs keyed by a database id are not: SQLite reuses the id of the
+newest row once it is deleted, so send_revalidated_file() sends them with
+the same ETag but Cache-Control: no-cache, and browsers get a cheap 304 as
+long as the content is unchanged. Conditional and Range requests (304 / 206)
+are answered by Werkzeug.
+
+File bodies are handed to the server's wsgi.file_wrapper (sendfile() on
+servers that support it) rather than read through Python. Behind a reverse
+proxy, MEDIA_ACCEL_REDIRECT (nginx X-Accel-Redirect) or USE_X_SENDFILE
+(Apache / lighttpd X-Sendfile) let the proxy send the file instead.
+"""
+import os
+import mimetypes
+import threading
+from collections import OrderedDict
+from typing import Optional
+from flask import current_app, send_file
+from werkzeug.exceptions import NotFound
+
+from .file import file_hash
+
+
+ETAG_CACHE_SIZE = 4096  # Files whose hash is remembered
+
+_etags = OrderedDict()  # path -> (mtime_ns, size, etag)
+_etag_lock = threading.Lock()
+
+
+def file_etag(file_path: str) -> str:
+    """
+    Content-derived ETag of a file
+
+    The hash is remembered per path and only recomputed when the file's
+    modification time or size changes, so repeat requests cost a stat().
+    """
+    st = os.stat(file_path)
+    with _etag_lock:
+        cached = _etags.get(file_path)
+        if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+            _etags.move_to_end(file_path)
+            return cached[2]
+
+    etag = file_hash(file_path)[:32]
+    _store_etag(file_path, st, etag)
+    return etag
+
+
+def _store_etag(file_path: str, st: os.stat_result, etag: str):
+    with _etag_lock:
+        _etags[file_path] = (st.st_mtime_ns, st.st_size, etag)
+        _etags.move_to_end(file_path)
+        while len(_etags) > ETAG_CACHE_SIZE:
+            _etags.popitem(last=False)
+
+
+def _accel_redirect(file_path: str, prefix: str, mimetype: Optional[str]):
+    """Empty response telling nginx to send the file from its internal location"""
+    relative = os.path.relpath(file_path, current_app.config['DATA_DIR'])
+    response = current_app.response_class(
+        mimetype=mimetype or mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+    )
+    response.headers['X-Accel-Redirect'] = f"{prefix.rstrip('/')}/{relative.replace(os.sep, '/')}"
+    return response
+
+
+def _send_cacheable_file(file_path: str, mimetype: Optional[str], etag: Optional[str],
+                         max_age: Optional[int]):
+    """File response with an ETag; max_age None sends it without a lifetime"""
+    if not os.path.isfile(file_path):
+        raise NotFound()
+
+    accel_prefix = current_app.config.get('MEDIA_ACCEL_REDIRECT')
+    if accel_prefix:
+        # nginx handles conditional and Range requests for the internal file
+        response = _accel_redirect(file_path, accel_prefix, mimetype)
+        response.cache_control.max_age = max_age
+    else:
+        response = send_file(
+            file_path,
+            mimetype=mimetype,
+            conditional=True,
+            etag=etag[:32] if etag else file_etag(file_path),
+            max_age=max_age
+        )
+    return response
+
+
+def send_immutable_file(file_path: str, mimetype: Optional[str] = None, etag: Optional[str] = None):
+    """
+    Serve a file whose content never changes under its URL
+
+    Only for content-addressed or randomly named URLs; see send_revalidated_file().
+
+    Args:
+        file_path: File to send (404 if it does not exist)
+        mimetype: Content type, guessed from the file name when omitted
+        etag: Known content hash (blob name), saves hashing the file
+
+    Returns:
+        Response with ETag, Cache-Control: public, max-age, immutable and
+        support for If-None-Match and Range requests
+    """
+    max_age = current_app.config.get('MEDIA_CACHE_MAX_AGE', 31536000)
+    response = _send_cacheable_file(file_path, mimetype, etag, max_age)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def send_revalidated_file(file_path: str, mimetype: Optional[str] = None, etag: Optional[str] = None):
+    """
+    Serve a file under a URL that may later point at other content
+
+    Same arguments as send_immutable_file().
+
+    Returns:
+        Response with ETag and Cache-Control: no-cache, so clients revalidate
+        every use and get a 304 while the content is unchanged
+    """
+    response = _send_cacheable_file(file_path, mimetype, etag, None)
+    response.cache_control.no_cache = True
+    return response
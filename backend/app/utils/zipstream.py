@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming ZIP Utilities
+
+Build ZIP archives entry by entry and hand out the bytes as soon as they are
+produced, so large exports never have to be held in memory.
+"""
+import os
+import unicodedata
+import zipfile
+from typing import Iterator, Union
+from urllib.parse import quote
+from flask import Response, stream_with_context
+
+
+CHUNK_SIZE = 256 * 1024  # Bytes collected before a chunk is handed out
+
+# Formats that are already compressed; deflating them only burns CPU
+STORED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'webp'}
+
+
+def compress_type_for(arcname: str) -> int:
+    """Store already-compressed images, deflate everything else"""
+    ext = arcname.rsplit('.', 1)[-1].lower() if '.' in arcname else ''
+    return zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+class _ChunkBuffer:
+    """Write-only file object that collects bytes until they are drained"""
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+            self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+
+class ZipStream:
+    """
+    ZIP writer that yields archive bytes while entries are being written
+
+    The underlying stream is not seekable, so zipfile falls back to data
+    descriptors and only one chunk of output is buffered at a time. Unless a
+    compression type is given, each entry gets the one from compress_type_for().
+
+    Usage:
+        zs = ZipStream()
+        yield from zs.writestr('classes.txt', 'cat\\ndog')
+        yield from zs.write('/path/to/image.jpg', 'images/image.jpg')
+        yield from zs.close()
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.bytes_written = 0
+        self._buffer = _ChunkBuffer()
+        self._zf = zipfile.ZipFile(self._buffer, 'w', zipfile.ZIP_DEFLATED)
+
+    def _drain(self) -> Iterator[bytes]:
+        if self._buffer.size:
+            data = self._buffer.drain()
+            self.bytes_written += len(data)
+            yield data
+
+    def write(self, path: str, arcname: str, compress_type: int = None) -> Iterator[bytes]:
+        """Add a file from disk, reading and emitting it chunk by chunk"""
+        zinfo = zipfile.ZipInfo.from_file(path, arcname)
+        zinfo.compress_type = compress_type_for(arcname) if compress_type is None else compress_type
+
+        with open(path, 'rb') as src, self._zf.open(zinfo, 'w') as dest:
+            while True:
+                chunk = src.read(self.chunk_size)
+                if not chunk:
+                    break
+                dest.write(chunk)
+                if self._buffer.size >= self.chunk_size:
+                    yield from self._drain()
+
+        yield from self._drain()
+
+    def writestr(self, arcname: str, data: Union[str, bytes], compress_type: int = None) -> Iterator[bytes]:
+        """Add an in-memory entry"""
+        if compress_type is None:
+            compress_type = compress_type_for(arcname)
+        self._zf.writestr(arcname, data, compress_type=compress_type)
+        yield from self._drain()
+
+    def close(self) -> Iterator[bytes]:
+        """Write the central directory"""
+        self._zf.close()
+        yield from self._drain()
+
+
+def attachment_header(download_name: str) -> str:
+    """Build a Content-Disposition value that survives non-ASCII names"""
+    try:
+        download_name.encode('ascii')
+        return f'attachment; filename="{download_name}"'
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        quoted = quote(download_name, safe="!#$&+-.^_`|~")
+        return f"attachment; filename=\"{simple}\"; filename*=UTF-8''{quoted}"
+
+
+def stream_zip_response(chunks: Iterator[bytes], download_name: str) -> Response:
+    """Send a ZIP generator as a chunked download"""
+    response = Response(stream_with_context(chunks), mimetype='application/zip')
+    response.headers['Content-Disposition'] = attachment_header(os.path.basename(download_name))
+    # Ask reverse proxies not to buffer the whole archive before forwarding it
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
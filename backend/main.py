@@ -6,6 +6,7 @@ import os
 import sys
 import webbrowser
 import threading
+import multiprocessing
 from app import create_app, get_data_dir
 from app.utils.network import get_local_ip
 
@@ -43,8 +44,30 @@ def main():
         from app.extensions import db
         db.create_all()
 
+        # Schema changes made since the database was created (migrations/)
+        from app.schema import upgrade_schema
+        upgrade_schema()
+
+        # Pick up export jobs interrupted by the last shutdown
+        from app.services.export_jobs import export_jobs
+        export_jobs.resume_pending()
+
+        # Finish upload batches interrupted by the last shutdown
+        from app.services.ingest import ingest
+        ingest.resume_pending()
+
+        # Periodic garbage collection of unreferenced files
+        from app.services.reclaim import reclaimer
+        reclaimer.start()
+
+        # Keep the SQLite write-ahead log small
+        from app.database import sqlite_profile
+        sqlite_profile.start_checkpoints()
+
     app.run(host=host, port=port, threaded=True)
 
 
 if __name__ == '__main__':
+    # Export augmentation workers are spawned processes; needed for the packaged exe
+    multiprocessing.freeze_support()
     main()
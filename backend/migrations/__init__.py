@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""
+Database Migrations
+
+Each module is one migration with a VERSION, a DESCRIPTION and an
+upgrade(conn) function; app.schema.upgrade_schema() applies those a
+database has not seen yet. Add new migrations with the next version number
+and list them below. Models already declare the final schema for new
+databases, so upgrades must tolerate finding their changes in place.
+"""
+from . import m0001_upload_columns
+from . import m0002_query_indexes
+from . import m0003_annotation_counts
+
+MIGRATIONS = [
+    m0001_upload_columns,
+    m0002_query_indexes,
+    m0003_annotation_counts,
+]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""
+Columns and indexes added for upload deduplication and blob storage
+
+Databases created before versioned migrations had these added by the
+previous schema check at startup; the helpers skip what is already there.
+"""
+from app.schema import add_column, create_index
+
+VERSION = 1
+DESCRIPTION = 'Content hashes, duplicate policy and blob key index'
+
+
+def upgrade(conn):
+    add_column(conn, 'images', 'content_hash')
+    add_column(conn, 'projects', 'duplicate_policy')
+    add_column(conn, 'upload_batches', 'duplicates')
+    create_index(conn, 'images', 'ix_images_project_content_hash')
+    create_index(conn, 'images', 'ix_images_file_path')
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""
+Indexes for the hot image and annotation queries
+
+- images (project_id, uploaded_at): list_images, sorted by upload time
+- images (project_id, status): annotated image counts, export filters
+- images (project_id, assigned_to, uploaded_at): get_my_images, sorted
+- images (project_id, annotated_by): per-member progress
+- annotations (image_id, class_id): annotations of an image; covers the
+  per-class counts of annotation_stats
+- annotations (class_id): annotations of a label class
+"""
+from app.schema import create_index
+
+VERSION = 2
+DESCRIPTION = 'Composite indexes for image listings and annotation lookups'
+
+
+def upgrade(conn):
+    for index_name in ('ix_images_project_uploaded', 'ix_images_project_status',
+                       'ix_images_project_assigned', 'ix_images_project_annotated'):
+        create_index(conn, 'images', index_name)
+    create_index(conn, 'annotations', 'ix_annotations_image_class')
+    create_index(conn, 'annotations', 'ix_annotations_class')
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+"""
+Denormalized annotation count on images, filled from the annotations table
+"""
+from app.schema import add_column
+
+VERSION = 3
+DESCRIPTION = 'Image annotation counts'
+
+
+def upgrade(conn):
+    add_column(conn, 'images', 'annotation_count')
+    conn.exec_driver_sql(
+        'UPDATE images SET annotation_count = '
+        '(SELECT COUNT(*) FROM annotations WHERE annotations.image_id = images.id)'
+    )
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Tests for app.services.augmentation"""
+import numpy as np
+import pytest
+from app.services.augmentation import Augmentor
+
+
+ANNOTATIONS = [
+    {'class_id': 1, 'bbox': [10.0, 10.0, 30.0, 20.0]},
+    {'class_id': 2, 'bbox': [50.0, 40.0, 2.0, 2.0]},  # Below min_box_size
+    {'class_id': 3, 'bbox': [70.0, 50.0, 20.0, 20.0]},  # Reaches past the right edge
+]
+
+# Without and with a geometric transform (a rotation by 0 degrees keeps every box in place)
+CONFIGS = [{}, {'rotation': True, 'rotation_range': (0, 0)}]
+
+
+def _image(channels: int = 3) -> np.ndarray:
+    return np.random.default_rng(0).integers(0, 256, (60, 80, channels), dtype=np.uint8)
+
+
+@pytest.mark.parametrize('config', CONFIGS)
+def test_small_boxes_are_dropped_from_every_sample(config):
+    augmentor = Augmentor(dict(config, min_box_size=5))
+    _, annos = augmentor.augment(_image(), ANNOTATIONS, np.random.default_rng(1))
+
+    assert [a['class_id'] for a in annos] == [1, 3]
+    assert annos[0]['bbox'] == pytest.approx([10, 10, 30, 20])
+    assert annos[1]['bbox'] == pytest.approx([70, 50, 10, 10])  # Clipped to the image
+
+
+@pytest.mark.parametrize('config', CONFIGS)
+def test_default_min_box_size_keeps_small_boxes(config):
+    _, annos = Augmentor(config).augment(_image(), ANNOTATIONS, np.random.default_rng(1))
+
+    assert [a['class_id'] for a in annos] == [1, 2, 3]
+
+
+def test_annotations_without_boxes_are_kept():
+    annotations = [{'class_id': 1, 'points': [[1, 2], [3, 4]]}]
+    _, annos = Augmentor({'min_box_size': 5}).augment(_image(), annotations, np.random.default_rng(1))
+
+    assert annos == annotations
+
+
+@pytest.mark.parametrize('option', ['brightness', 'saturation', 'contrast'])
+def test_color_adjustment_keeps_alpha(option):
+    image = _image(4)
+    config = {option: True, f'{option}_range': (0.5, 0.5) if option != 'brightness' else (-0.5, -0.5)}
+    augmented, _ = Augmentor(config).augment(image, [], np.random.default_rng(1))
+
+    assert augmented.shape == image.shape
+    np.testing.assert_array_equal(augmented[..., 3], image[..., 3])
+    assert not np.array_equal(augmented[..., :3], image[..., :3])
+
+
+def test_color_adjustment_of_bgra_matches_bgr():
+    image = _image(4)
+    config = {'brightness': True, 'saturation': True, 'contrast': True}
+    bgra, _ = Augmentor(config).augment(image, [], np.random.default_rng(2))
+    bgr, _ = Augmentor(config).augment(np.ascontiguousarray(image[..., :3]), [], np.random.default_rng(2))
+
+    np.testing.assert_array_equal(bgra[..., :3], bgr)
@@ -16,6 +16,10 @@ export default defineConfig({
       '/api': {
         target: 'http://localhost:5000',
         changeOrigin: true
+      },
+      '/media': {
+        target: 'http://localhost:5000',
+        changeOrigin: true
       }
     }
   },
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+SQLite Concurrency Benchmark
+
+Simulates a classroom on one database: many students saving annotations,
+others listing images, and an export reading the whole project in a long
+transaction. Runs once with SQLite's defaults (what the app used before the
+engine profile) and once with the profile from backend/app/database.py, and
+prints read / write throughput, write latency and "database is locked"
+errors for both.
+
+Usage:
+    python scripts/bench_sqlite.py [--writers 40] [--readers 8] [--duration 10]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'backend'))
+
+from sqlalchemy import create_engine, event, text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.database import apply_pragmas, sqlite_pragmas  # noqa: E402
+from app.extensions import db  # noqa: E402
+import app.models  # noqa: E402,F401  (registers the tables)
+
+
+def make_engine(path: str, tuned: bool, pool_size: int):
+    engine = create_engine(f'sqlite:///{path}', pool_size=pool_size, max_overflow=0)
+    if tuned:
+        pragmas = sqlite_pragmas({k: getattr(Config, k) for k in dir(Config) if k.startswith('SQLITE_')})
+        event.listen(engine, 'connect', lambda conn, record: apply_pragmas(conn, pragmas))
+    return engine
+
+
+def seed(engine, images: int):
+    db.metadata.create_all(engine)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO projects (id, name, created_at, updated_at) VALUES (1, 'bench', :now, :now)"),
+                     {'now': now})
+        conn.execute(text("INSERT INTO label_classes (id, project_id, name, color) VALUES (1, 1, 'a', '#FF0000')"))
+        conn.execute(text(
+            "INSERT INTO images (id, project_id, filename, file_path, status, uploaded_at) "
+            "VALUES (:id, 1, :name, :name, 'pending', :now)"
+        ), [{'id': i, 'name': f'{i}.jpg', 'now': now} for i in range(1, images + 1)])
+        conn.execute(text(
+            "INSERT INTO annotations (image_id, class_id, annotation_type, data, created_at, updated_at) "
+            "VALUES (:image_id, 1, 'bbox', :data, :now, :now)"
+        ), [{'image_id': i, 'data': json.dumps({'x': 1, 'y': 2, 'width': 3, 'height': 4}), 'now': now}
+            for i in range(1, images + 1) for _ in range(2)])
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.reads = 0
+        self.write_errors = 0
+        self.read_errors = 0
+        self.write_latencies = []
+
+    def add(self, kind: str, ok: bool, latency: float = 0.0):
+        with self.lock:
+            if kind == 'write':
+                if ok:
+                    self.writes += 1
+                    self.write_latencies.append(latency)
+                else:
+                    self.write_errors += 1
+            elif ok:
+                self.reads += 1
+            else:
+                self.read_errors += 1
+
+
+def writer(engine, images: int, stats: Stats, stop: threading.Event):
+    """save_annotations: replace an image's annotations and mark it annotated"""
+    rng = random.Random()
+    while not stop.is_set():
+        image_id = rng.randint(1, images)
+        now = datetime.utcnow()
+        started = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                conn.execute(text('DELETE FROM annotations WHERE image_id = :id'), {'id': image_id})
+                conn.execute(text(
+                    "INSERT INTO annotations (image_id, class_id, annotation_type, data, created_at, updated_at) "
+                    "VALUES (:id, 1, 'bbox', :data, :now, :now)"
+                ), [{'id': image_id, 'data': json.dumps({'x': k, 'y': k, 'width': 5, 'height': 5}), 'now': now}
+                    for k in range(3)])
+                conn.execute(text("UPDATE images SET status = 'annotated' WHERE id = :id"), {'id': image_id})
+            stats.add('write', True, time.perf_counter() - started)
+        except OperationalError:
+            stats.add('write', False)
+        time.sleep(rng.uniform(0, 0.02))  # Think time between saves
+
+
+def reader(engine, stats: Stats, stop: threading.Event):
+    """list_images and annotation_stats"""
+    while not stop.is_set():
+        try:
+            with engine.connect() as conn:
+                conn.execute(text(
+                    'SELECT * FROM images WHERE project_id = 1 ORDER BY uploaded_at DESC LIMIT 200'
+                )).fetchall()
+                conn.execute(text(
+                    'SELECT class_id, COUNT(*) FROM annotations JOIN images ON images.id = annotations.image_id '
+                    'WHERE images.project_id = 1 GROUP BY class_id'
+                )).fetchall()
+            stats.add('read', True)
+        except OperationalError:
+            stats.add('read', False)
+
+
+def exporter(engine, stop: threading.Event):
+    """An export reading every annotation inside one long read transaction"""
+    while not stop.is_set():
+        try:
+            with engine.connect() as conn:
+                conn.exec_driver_sql('BEGIN')
+                result = conn.execute(text(
+                    'SELECT images.id, annotations.data FROM images '
+                    'JOIN annotations ON annotations.image_id = images.id WHERE images.project_id = 1'
+                ))
+                while not stop.is_set() and result.fetchmany(500):
+                    time.sleep(0.05)  # Writing the zip between batches
+                conn.exec_driver_sql('COMMIT')
+        except OperationalError:
+            time.sleep(0.1)
+
+
+def run(label: str, tuned: bool, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(os.path.join(tmp, 'bench.db'), tuned, args.writers + args.readers + 2)
+        seed(engine, args.images)
+
+        stats = Stats()
+        stop = threading.Event()
+        threads = [threading.Thread(target=writer, args=(engine, args.images, stats, stop))
+                   for _ in range(args.writers)]
+        threads += [threading.Thread(target=reader, args=(engine, stats, stop)) for _ in range(args.readers)]
+        if not args.no_export:
+            threads.append(threading.Thread(target=exporter, args=(engine, stop)))
+
+        for t in threads:
+            t.start()
+        time.sleep(args.duration)
+        stop.set()
+        for t in threads:
+            t.join()
+        engine.dispose()
+
+    latencies = sorted(stats.write_latencies) or [0.0]
+    return {
+        'profile': label,
+        'writes/s': stats.writes / args.duration,
+        'reads/s': stats.reads / args.duration,
+        'locked': stats.write_errors + stats.read_errors,
+        'p50 ms': latencies[len(latencies) // 2] * 1000,
+        'p95 ms': latencies[int(len(latencies) * 0.95)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--writers', type=int, default=40, help='Threads saving annotations')
+    parser.add_argument('--readers', type=int, default=8, help='Threads listing images')
+    parser.add_argument('--images', type=int, default=5000, help='Images in the project')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds per profile')
+    parser.add_argument('--no-export', action='store_true', help='Without the long-running export reader')
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers, {args.readers} readers, {args.images} images, "
+          f"{'with' if not args.no_export else 'without'} export, {args.duration:g}s per profile")
+    results = [run('default', False, args), run('tuned', True, args)]
+
+    columns = ['profile', 'writes/s', 'reads/s', 'locked', 'p50 ms', 'p95 ms']
+    print(''.join(f'{c:>12}' for c in columns))
+    for result in results:
+        print(''.join(f'{result[c]:>12.1f}' if isinstance(result[c], float) else f'{result[c]:>12}'
+                      for c in columns))
+
+
+if __name__ == '__main__':
+    main()
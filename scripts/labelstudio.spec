@@ -48,6 +48,7 @@ a = Analysis(
         'app.routes',
         'app.services',
         'app.utils',
+        'migrations',
     ],
     hookspath=[],
     hooksconfig={},
@@ -71,6 +71,7 @@ class AnnotationSkill(BaseSkill):
         def _create():
             from app.models import Image, Annotation, LabelClass
             from app import db
+            from app.services.annotation_counts import adjust_annotation_counts
 
             image = Image.query.get(image_id)
             if not image:
@@ -89,8 +90,9 @@ class AnnotationSkill(BaseSkill):
 
             db.session.add(annotation)
 
-            # Update image status
+            # Update image status and count
             image.status = 'annotated'
+            adjust_annotation_counts({image.id: 1})
 
             db.session.commit()
 
@@ -118,9 +120,11 @@ class AnnotationSkill(BaseSkill):
         def _batch():
             from app.models import Annotation
             from app import db
+            from app.services.annotation_counts import adjust_annotation_counts
 
             created = 0
             errors = []
+            per_image = {}
 
             for anno_data in annotations:
                 try:
@@ -132,9 +136,11 @@ class AnnotationSkill(BaseSkill):
                     anno.set_data(anno_data.get('data', {}))
                     db.session.add(anno)
                     created += 1
+                    per_image[anno.image_id] = per_image.get(anno.image_id, 0) + 1
                 except Exception as e:
                     errors.append(str(e))
 
+            adjust_annotation_counts(per_image)
             db.session.commit()
 
             self.log_action('batch_create', {
@@ -181,11 +187,13 @@ class AnnotationSkill(BaseSkill):
         def _delete():
             from app.models import Annotation
             from app import db
+            from app.services.annotation_counts import adjust_annotation_counts
 
             annotation = Annotation.query.get(annotation_id)
             if not annotation:
                 return {'error': f'Annotation {annotation_id} not found'}
 
+            adjust_annotation_counts({annotation.image_id: -1})
             db.session.delete(annotation)
             db.session.commit()
 
@@ -8,10 +8,76 @@ Provides image augmentation operations for AI agents:
 - Batch augmentation
 """
 import os
-from typing import Dict, Any, List, Optional
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
 from .base import BaseSkill
 
 
+# Decoded preview sources reused across preview calls, so trying different
+# configs on the same image does not decode it again
+PREVIEW_CACHE_SIZE = 16
+_preview_cache = OrderedDict()
+_preview_cache_lock = threading.Lock()
+
+
+def _load_preview_source(file_path: str, max_side: Optional[int]) -> Tuple[Any, float]:
+    """
+    Decode an image for previews
+
+    With max_side set, JPEGs are decoded at 1/2, 1/4 or 1/8 size by the
+    decoder itself (IMREAD_REDUCED_*) and then resized to at most max_side.
+
+    Returns:
+        (BGR image or None, preview pixels per original pixel)
+    """
+    import cv2
+    from PIL import Image as PILImage
+
+    try:
+        key = (file_path, os.path.getmtime(file_path), max_side)
+    except OSError:
+        return None, 1.0
+
+    with _preview_cache_lock:
+        if key in _preview_cache:
+            _preview_cache.move_to_end(key)
+            return _preview_cache[key]
+
+    if max_side:
+        try:
+            with PILImage.open(file_path) as pil_img:
+                full_side = max(pil_img.size)
+        except OSError:
+            return None, 1.0
+
+        flag = cv2.IMREAD_COLOR
+        for factor, reduced in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                                (2, cv2.IMREAD_REDUCED_COLOR_2)):
+            if full_side / factor >= max_side:
+                flag = reduced
+                break
+
+        img = cv2.imread(file_path, flag)
+        if img is not None and max(img.shape[:2]) > max_side:
+            ratio = max_side / max(img.shape[:2])
+            size = (max(1, round(img.shape[1] * ratio)), max(1, round(img.shape[0] * ratio)))
+            img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+        scale = max(img.shape[:2]) / full_side if img is not None else 1.0
+    else:
+        img = cv2.imread(file_path)
+        scale = 1.0
+
+    if img is None:
+        return None, 1.0
+
+    with _preview_cache_lock:
+        _preview_cache[key] = (img, scale)
+        while len(_preview_cache) > PREVIEW_CACHE_SIZE:
+            _preview_cache.popitem(last=False)
+    return img, scale
+
+
 class AugmentationSkill(BaseSkill):
     """Image augmentation skill for AI agents"""
 
@@ -55,6 +121,17 @@ class AugmentationSkill(BaseSkill):
             'brightness_range': (-0.2, 0.2),
             'blur': True,
             'blur_radius': 2
+        },
+        'mosaic': {
+            'mosaic': True,
+            'mosaic_prob': 1.0,
+            'mixup': True,
+            'mixup_prob': 0.15,
+            'horizontal_flip': True,
+            'scale': True,
+            'scale_range': (0.8, 1.2),
+            'brightness': True,
+            'brightness_range': (-0.2, 0.2)
         }
     }
 
@@ -75,7 +152,8 @@ class AugmentationSkill(BaseSkill):
                     'description': 'Preview augmentation on a single image',
                     'params': {
                         'image_id': 'int - Image ID',
-                        'config': 'dict - Augmentation config'
+                        'config': 'dict - Augmentation config',
+                        'preview_size': 'int - Longest side of the preview in pixels (0 = full resolution)'
                     }
                 },
                 'apply_augmentation': {
@@ -108,6 +186,10 @@ class AugmentationSkill(BaseSkill):
                 'detection': {
                     'description': 'Optimized for object detection tasks',
                     'config': self.PRESETS['detection']
+                },
+                'mosaic': {
+                    'description': 'YOLO-style training - 4-image mosaic + occasional mixup',
+                    'config': self.PRESETS['mosaic']
                 }
             }
         }
@@ -202,6 +284,28 @@ class AugmentationSkill(BaseSkill):
                     'min': 0,
                     'max': 5
                 }
+            ],
+            'multi_image': [
+                {
+                    'id': 'mosaic',
+                    'name': 'Mosaic',
+                    'name_zh': '馬賽克拼接',
+                    'type': 'value',
+                    'value_param': 'mosaic_prob',
+                    'default': 1.0,
+                    'min': 0,
+                    'max': 1
+                },
+                {
+                    'id': 'mixup',
+                    'name': 'MixUp',
+                    'name_zh': '混合疊圖',
+                    'type': 'value',
+                    'value_param': 'mixup_prob',
+                    'default': 0.5,
+                    'min': 0,
+                    'max': 1
+                }
             ]
         }
 
@@ -210,25 +314,29 @@ class AugmentationSkill(BaseSkill):
         image_id: int,
         config: Optional[Dict[str, Any]] = None,
         preset: Optional[str] = None,
-        num_samples: int = 4
+        num_samples: int = 4,
+        preview_size: Optional[int] = 400
     ) -> Dict[str, Any]:
         """
         Preview augmentation on a single image
 
         Args:
             image_id: Image ID
-            config: Custom augmentation config
+            config: Custom augmentation config ('seed' makes samples reproducible)
             preset: Use a preset instead of custom config
             num_samples: Number of augmented samples to generate
+            preview_size: Decode and augment at most this many pixels on the
+                longest side; 0 or None works on the full-resolution image
 
         Returns:
-            Augmentation preview results
+            Augmentation preview results, annotations in preview pixels
+            (preview_scale = preview pixels per original pixel)
         """
         def _preview():
             import cv2
             import base64
             from app.models import Image
-            from app.services.augmentation import Augmentor
+            from app.services.augmentation import Augmentor, sample_rng
 
             image = Image.query.get(image_id)
             if not image:
@@ -241,28 +349,50 @@ class AugmentationSkill(BaseSkill):
             if not aug_config:
                 aug_config = self.PRESETS['medium']
 
-            # Load image
-            img = cv2.imread(image.file_path)
+            # Load image (reduced size decode, cached across calls)
+            img, scale = _load_preview_source(image.file_path, preview_size)
             if img is None:
                 return {'error': 'Failed to load image'}
 
-            # Get annotations
-            annotations = []
-            for anno in image.annotations.all():
-                if anno.annotation_type == 'bbox':
-                    data = anno.get_data()
-                    annotations.append({
-                        'bbox': [data['x'], data['y'], data['width'], data['height']],
-                        'class': anno.label_class.name
-                    })
-
-            # Generate augmented samples
+            def bbox_annotations(img_record, img_scale):
+                annotations = []
+                for anno in img_record.annotations.all():
+                    if anno.annotation_type == 'bbox':
+                        data = anno.get_data()
+                        annotations.append({
+                            'bbox': [data['x'] * img_scale, data['y'] * img_scale,
+                                     data['width'] * img_scale, data['height'] * img_scale],
+                            'class': anno.label_class.name
+                        })
+                return annotations
+
+            # Get annotations, scaled to the preview
+            annotations = bbox_annotations(image, scale)
+
             augmentor = Augmentor(aug_config)
-            samples = []
+            seed = aug_config.get('seed')
+            rngs = [sample_rng(seed, image_id, i) for i in range(num_samples)]
+
+            if augmentor.needs_partners:
+                # Mosaic / mixup partners: other images of the project, decoded once
+                partners = []
+                others = Image.query.filter(
+                    Image.project_id == image.project_id, Image.id != image.id
+                ).order_by(Image.id).limit(3).all()
+                for other in others:
+                    other_img, other_scale = _load_preview_source(other.file_path, preview_size)
+                    if other_img is not None:
+                        partners.append((other_img, bbox_annotations(other, other_scale)))
 
-            for i in range(num_samples):
-                aug_img, aug_annos = augmentor.augment(img, annotations)
+                sources = [augmentor.combine(img, annotations, partners, rng) for rng in rngs]
+                aug_imgs, aug_annos_list = augmentor.augment_batch(
+                    [src for src, _ in sources], [annos for _, annos in sources], rngs)
+            else:
+                # Generate all augmented samples in one batch
+                aug_imgs, aug_annos_list = augmentor.augment_batch(img, annotations, rngs)
 
+            samples = []
+            for i, (aug_img, aug_annos) in enumerate(zip(aug_imgs, aug_annos_list)):
                 # Convert to base64 for preview
                 _, buffer = cv2.imencode('.jpg', aug_img, [cv2.IMWRITE_JPEG_QUALITY, 80])
                 img_base64 = base64.b64encode(buffer).decode()
@@ -276,6 +406,7 @@ class AugmentationSkill(BaseSkill):
             return {
                 'image_id': image_id,
                 'config': aug_config,
+                'preview_scale': scale,
                 'samples': samples
             }
 
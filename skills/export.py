@@ -153,7 +153,8 @@ class ExportSkill(BaseSkill):
             Preview of export contents
         """
         def _preview():
-            from app.models import Project
+            from app.models import Project, Image, Annotation
+            from sqlalchemy import func
 
             project = Project.query.get(project_id)
             if not project:
@@ -161,14 +162,18 @@ class ExportSkill(BaseSkill):
 
             classes = [c.to_dict() for c in project.label_classes.all()]
 
-            # Count images by split
+            # Count images by split (one grouped query)
             splits = {'train': 0, 'val': 0, 'test': 0}
-            total_annotations = 0
-
-            for image in project.images.all():
-                split = image.split or 'train'
-                splits[split] = splits.get(split, 0) + 1
-                total_annotations += image.annotations.count()
+            split_counts = Image.query.filter_by(project_id=project_id).with_entities(
+                Image.split, func.count(Image.id)
+            ).group_by(Image.split).all()
+            for split, count in split_counts:
+                split = split or 'train'
+                splits[split] = splits.get(split, 0) + count
+
+            total_annotations = Annotation.query.join(
+                Image, Annotation.image_id == Image.id
+            ).filter(Image.project_id == project_id).count()
 
             return {
                 'project_id': project_id,